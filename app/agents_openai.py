@@ -1,37 +1,359 @@
+import argparse
 import asyncio
+import json
+import random
+import time
+from contextvars import ContextVar
+
+import anyio
+import httpx
 from agents import Agent, Runner, gen_trace_id, trace
+from agents.exceptions import UserError
 from agents.mcp import MCPServer, MCPServerSse
 from agents.model_settings import ModelSettings
+from openai.types.responses import ResponseTextDeltaEvent
+
+# Errors that mean the SSE session is gone rather than that a tool failed
+CONNECTION_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+    ConnectionError,
+    UserError,  # "Server not initialized" while the session is being replaced
+)
+
+# Per-question timing buckets, filled in by ResilientMCPServerSse while Runner.run works
+TURN_TIMINGS: ContextVar = ContextVar("turn_timings", default=None)
+
+def new_timings() -> dict:
+    timings = {"discovery_s": 0.0, "tools_s": 0.0, "tool_calls": 0, "reconnects": 0}
+    TURN_TIMINGS.set(timings)
+    return timings
+
+def finish_timings(timings: dict, total: float) -> dict:
+    """Everything that isn't tool discovery or tool execution is the model (plus SDK overhead)."""
+    timings["total_s"] = round(total, 3)
+    timings["llm_s"] = round(max(0.0, total - timings["discovery_s"] - timings["tools_s"]), 3)
+    timings["discovery_s"] = round(timings["discovery_s"], 3)
+    timings["tools_s"] = round(timings["tools_s"], 3)
+    return timings
+
+def _add_timing(name: str, seconds: float):
+    timings = TURN_TIMINGS.get()
+    if timings is not None:
+        timings[name] += seconds
+
+class ResilientMCPServerSse(MCPServerSse):
+    """
+    MCPServerSse that keeps its tool list between runs and reconnects.
+
+    The SDK lists the server's tools on every turn of every Runner.run; here
+    the list is cached until the server's /status reports a different
+    tools_version (checked at most every `version_check_seconds`). A dropped
+    SSE connection is re-established with exponential backoff (full jitter)
+    and the call retried; the cached tool list survives the reconnect. Our
+    tools are read-only, so retrying a call is safe.
+
+    The session is opened, closed and reopened only by one supervisor task
+    (see _supervise): the SSE transport holds anyio cancel scopes, which
+    must be exited by the task that entered them, and the SDK calls tools
+    from its own asyncio.gather tasks.
+    """
+
+    def __init__(
+        self,
+        params: dict,
+        name: str = None,
+        status_url: str = None,
+        version_check_seconds: float = 30.0,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 15.0,
+        tool_timeout: float = 60.0,
+    ):
+        # tool_timeout is the ClientSession read timeout. It is not a sign of a dead connection (a page
+        # of file contents can take a while), so it is not retried; raise it for slow tools instead.
+        super().__init__(params=params, cache_tools_list=True, name=name, client_session_timeout_seconds=tool_timeout)
+        self.status_url = status_url or params["url"].rsplit("/sse", 1)[0] + "/status"
+        self.version_check_seconds = version_check_seconds
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.tools_version = None
+        self._checked_at = 0.0
+        self._epoch = 0  # bumped on every (re)connect, so concurrent callers reconnect once
+        self._supervisor = None
+        self._ready = asyncio.Event()  # set while connected, or once the supervisor has given up
+        self._reconnect_wanted = asyncio.Event()
+        self._failure = None  # why the supervisor stopped
+        self._closing = False
+
+    async def _check_tools_version(self):
+        if time.monotonic() - self._checked_at < self.version_check_seconds:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(self.status_url)
+            version = response.json().get("tools_version")
+        except (httpx.HTTPError, ValueError):
+            return  # no signal; keep the cache until the next check
+        if version != self.tools_version:
+            if self.tools_version is not None:
+                print(f"Server tools changed ({self.tools_version} -> {version}); refreshing the tool list")
+            self.tools_version = version
+            self.invalidate_tools_cache()
+
+    async def _open_session(self) -> bool:
+        for attempt in range(self.max_retries):
+            if attempt or self._epoch:
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+            try:
+                await super().connect()  # cleans up after itself on failure
+            except Exception as e:
+                print(f"Connect attempt {attempt + 1}/{self.max_retries} to {self.name} failed: {e}")
+                continue
+            if self._epoch:
+                print(f"Reconnected to {self.name} after {attempt + 1} attempt(s)")
+            self._epoch += 1
+            return True
+        return False
+
+    async def _supervise(self):
+        """
+        Connects, then waits until a caller reports the connection lost (or
+        cleanup() is called), closes the session and connects again, all in
+        this one task. If a round of max_retries attempts fails, the waiting
+        callers get a ConnectionError and the next call starts a new round.
+        """
+        try:
+            while not self._closing:
+                if not await self._open_session():
+                    self._failure = f"Could not connect to {self.name} after {self.max_retries} attempts"
+                    return
+                self._ready.set()
+                await self._reconnect_wanted.wait()
+                self._reconnect_wanted.clear()
+                self._ready.clear()
+                await super().cleanup()
+        finally:
+            await super().cleanup()
+            if self._failure is None:
+                self._failure = f"Not connected to {self.name}"
+            self._ready.set()  # wake the waiters; they see _failure
+
+    async def _wait_ready(self):
+        if self._closing:
+            raise UserError(f"{self.name} is closed")
+        if self._supervisor is None or self._supervisor.done():
+            self._failure = None
+            self._ready.clear()
+            self._supervisor = asyncio.create_task(self._supervise(), name=f"mcp-session {self.name}")
+        await self._ready.wait()
+        if self._failure is not None:
+            raise ConnectionError(self._failure)
+
+    def _request_reconnect(self, epoch: int):
+        if epoch == self._epoch and self._ready.is_set() and self._failure is None:
+            self._ready.clear()
+            self._reconnect_wanted.set()
 
-async def run(mcp_server: MCPServer):
-    agent = Agent(
+    async def connect(self):
+        """Starts the session supervisor and waits for the first connection."""
+        self._closing = False
+        await self._wait_ready()
+
+    async def cleanup(self):
+        """Stops the supervisor, which closes the session in its own task."""
+        if asyncio.current_task() is self._supervisor:
+            await super().cleanup()  # MCPServerSse.connect() cleaning up after a failed attempt
+            return
+        self._closing = True
+        supervisor = self._supervisor
+        if supervisor is None or supervisor.done():
+            return
+        if self._ready.is_set():
+            self._reconnect_wanted.set()
+        else:
+            supervisor.cancel()  # still (re)connecting
+        await asyncio.wait([supervisor])
+
+    async def _with_reconnect(self, call, attempts: int = 3):
+        for attempt in range(attempts):
+            await self._wait_ready()
+            epoch = self._epoch
+            try:
+                return await call()
+            except CONNECTION_ERRORS as e:
+                if attempt == attempts - 1:
+                    raise
+                print(f"MCP connection lost ({type(e).__name__}: {e}); reconnecting")
+                _add_timing("reconnects", 1)
+                self._request_reconnect(epoch)
+
+    async def list_tools(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            await self._check_tools_version()
+            return await self._with_reconnect(lambda: super(ResilientMCPServerSse, self).list_tools(*args, **kwargs))
+        finally:
+            _add_timing("discovery_s", time.perf_counter() - started)
+
+    async def call_tool(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._with_reconnect(lambda: super(ResilientMCPServerSse, self).call_tool(*args, **kwargs))
+        finally:
+            _add_timing("tools_s", time.perf_counter() - started)
+            _add_timing("tool_calls", 1)
+
+def make_agent(mcp_server: MCPServer) -> Agent:
+    return Agent(
         name="Assistant",
         instructions="Use the tools to answer the questions.",
         mcp_servers=[mcp_server],
         model_settings=ModelSettings(tool_choice="required"),
     )
 
+async def run_streamed(agent: Agent, message: str, echo: bool = True) -> tuple:
+    """
+    Runs `message` with Runner.run_streamed, printing answer tokens and tool calls
+    as they arrive when `echo`. Returns (final_output, latency) where latency has
+    the seconds to the first visible event (tool call or token), to the first
+    answer token (TTFT) and in total.
+    """
+    started = time.perf_counter()
+    latency = {"first_event_s": None, "ttft_s": None}
+    result = Runner.run_streamed(starting_agent=agent, input=message)
+    async for event in result.stream_events():
+        elapsed = round(time.perf_counter() - started, 3)
+        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+            if latency["ttft_s"] is None:
+                latency["ttft_s"] = elapsed
+                if echo:
+                    print("Assistant Response: ", end="")
+            if echo:
+                print(event.data.delta, end="", flush=True)
+        elif event.type == "run_item_stream_event" and event.item.type in ("tool_call_item", "tool_call_output_item"):
+            if echo and event.item.type == "tool_call_item":
+                raw = event.item.raw_item
+                print(f"[tool call] {getattr(raw, 'name', raw)}({getattr(raw, 'arguments', '')})", flush=True)
+            elif echo:
+                print(f"[tool result] {len(str(event.item.output))} chars", flush=True)
+        else:
+            continue
+        if latency["first_event_s"] is None:
+            latency["first_event_s"] = elapsed
+    if echo:
+        print()
+    latency["total_s"] = round(time.perf_counter() - started, 3)
+    return result.final_output, latency
+
+async def run(mcp_server: MCPServer, stream: bool = False):
+    agent = make_agent(mcp_server)
+
     while True:
         message = input("Ask something (or type 'exit' to quit): ")
         if message.lower() == "exit":
             break
         try:
             trace_id = gen_trace_id()
+            timings = new_timings()
+            started = time.perf_counter()
             with trace(workflow_name="MCP Tool Interaction", trace_id=trace_id):
                 print(f"Trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
-                result = await Runner.run(starting_agent=agent, input=message)
-                print("Assistant Response:", result.final_output)
+                if stream:
+                    _, latency = await run_streamed(agent, message)
+                    print(f"Latency: first token {latency['ttft_s']}s, total {latency['total_s']}s")
+                else:
+                    result = await Runner.run(starting_agent=agent, input=message)
+                    print("Assistant Response:", result.final_output)
+            finish_timings(timings, time.perf_counter() - started)
+            print(
+                f"Timing: {timings['total_s']}s total = {timings['llm_s']}s model, "
+                f"{timings['tools_s']}s in {timings['tool_calls']} tool call(s), {timings['discovery_s']}s tool discovery"
+            )
         except Exception as e:
             print("Error:", e)
 
+async def answer(agent: Agent, record: dict, stream: bool = False) -> dict:
+    """Runs one batch question under its own trace; failures are reported in the record, not raised."""
+    question = record.get("question") or record.get("input")
+    trace_id = gen_trace_id()
+    output = {"id": record.get("id"), "question": question, "trace_id": trace_id}
+    timings = new_timings()
+    started = time.perf_counter()
+    output["started_at"] = time.time()
+    try:
+        with trace(workflow_name="MCP Batch Evaluation", trace_id=trace_id):
+            if stream:
+                output["answer"], output["streaming"] = await run_streamed(agent, question, echo=False)
+            else:
+                output["answer"] = (await Runner.run(starting_agent=agent, input=question)).final_output
+        output["error"] = None
+    except Exception as e:
+        output["answer"] = None
+        output["error"] = f"{type(e).__name__}: {e}"
+    output["latency_s"] = round(time.perf_counter() - started, 3)
+    output["timings"] = finish_timings(timings, time.perf_counter() - started)
+    return output
+
+async def run_batch(mcp_server: MCPServer, input_path: str, output_path: str, concurrency: int = 4, stream: bool = False):
+    """
+    Answers every question in `input_path` (JSONL with "question" or "input",
+    and an optional "id"), at most `concurrency` at a time over the one
+    shared MCP session. Results are appended to `output_path` as they finish.
+    """
+    agent = make_agent(mcp_server)
+    with open(input_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for i, record in enumerate(records):
+        record.setdefault("id", i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    failed = 0
+
+    async def limited(record):
+        async with semaphore:
+            return await answer(agent, record, stream)
+
+    with open(output_path, "a") as out:
+        for done in asyncio.as_completed([limited(record) for record in records]):
+            output = await done
+            failed += output["error"] is not None
+            out.write(json.dumps(output) + "\n")
+            out.flush()
+            print(f"[{output['id']}] {output['latency_s']}s {'error: ' + output['error'] if output['error'] else 'ok'}")
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Answered {len(records) - failed}/{len(records)} questions in {elapsed:.1f}s "
+        f"({len(records) / elapsed if elapsed else 0:.2f}/s, concurrency {concurrency}) -> {output_path}"
+    )
+
 async def main():
-    async with MCPServerSse(
+    parser = argparse.ArgumentParser(description="Ask the MCP-backed agent interactively or in batch")
+    parser.add_argument("--url", default="http://localhost:8000/sse")
+    parser.add_argument("--batch", help="JSONL file of questions to answer non-interactively")
+    parser.add_argument("--out", default="answers.jsonl", help="batch output JSONL (appended)")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight in batch mode")
+    parser.add_argument("--stream", action="store_true", help="stream tokens and tool calls, and record time to first token")
+    parser.add_argument("--tool-timeout", type=float, default=60.0, help="seconds to wait for one MCP tool call")
+    args = parser.parse_args()
+
+    async with ResilientMCPServerSse(
         name="SSE Python Server",
         params={
-            "url": "http://localhost:8000/sse",
+            "url": args.url,
         },
+        tool_timeout=args.tool_timeout,
     ) as server:
-        await run(server)
+        if args.batch:
+            await run_batch(server, args.batch, args.out, args.concurrency, args.stream)
+        else:
+            await run(server, args.stream)
 
 if __name__ == "__main__":
     asyncio.run(main())
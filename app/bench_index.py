@@ -0,0 +1,192 @@
+# Benchmarks index refresh, snapshot load and query latency against a
+# synthetic bucket, without touching the real romitestbucket07:
+#
+#   python bench_index.py --objects 10000 100000 1000000 --workers 32 --latency-ms 5
+#
+# Each object count runs in a fresh process so peak RSS is per size.
+# Results are written to bench_results/index-<timestamp>.json for comparison.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+
+from fake_s3 import SyntheticS3
+from index_snapshot import open_snapshot, write_snapshot
+from object_fetch import ObjectFetcher
+from tag_harvester import harvest_tags
+from tag_index import TagIndex
+
+INDEXED_TAGS = os.getenv("TAG_INDEX_TAGS", "model_config,user_id,year,month,day").split(",")  # same default as mcp_server
+BUCKET = "synthetic-bucket"
+PAGE_SIZE = 25
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples: list) -> dict:
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+    }
+
+
+def representative_queries(fake: SyntheticS3) -> dict:
+    """Filter combinations the agents actually send, from broad to narrow."""
+    mid = fake.start_date + timedelta(days=fake.days // 2)
+    date_from, date_to = mid.isoformat(), (mid + timedelta(days=29)).isoformat()
+    year, month = str(mid.year), f"{mid.month:02d}"
+    top_user = "user00001@example.com"
+    rare_user = f"user{max(1, fake.users // 2):05d}@example.com"
+    return {
+        "model_config": ({"model_config": "test1"}, None, None),
+        "year_month": ({"year": year, "month": month}, None, None),
+        "top_user": ({"user_id": top_user}, None, None),
+        "rare_user": ({"user_id": rare_user}, None, None),
+        "top_user_model_config": ({"user_id": top_user, "model_config": "test2"}, None, None),
+        "last_30_days": ({}, date_from, date_to),
+        "top_user_last_30_days": ({"user_id": top_user}, date_from, date_to),
+        "exact_day": ({"model_config": "test1", "year": year, "month": month, "day": "15"}, None, None),
+    }
+
+
+def bench_queries(index: TagIndex, queries: dict, repeat: int) -> dict:
+    results = {}
+    for name, (filters, date_from, date_to) in queries.items():
+        samples = []
+        matched = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ids = index.match(filters, date_from=date_from, date_to=date_to)
+            page_ids, _ = index.page(ids, limit=PAGE_SIZE)
+            keys = index.keys_for(page_ids)
+            [index.meta.get(key) for key in keys]  # metadata-only page
+            samples.append(time.perf_counter() - started)
+            matched = len(ids)
+        results[name] = {"matched": matched, **latency_summary(samples)}
+    return results
+
+
+def bench_fetch(index: TagIndex, fake: SyntheticS3, concurrency: int, repeat: int) -> dict:
+    keys = index.keys_for(index.page(index.match({"model_config": "test1"}), limit=PAGE_SIZE)[0])
+    fetcher = ObjectFetcher(BUCKET, max_concurrency=concurrency, s3=fake)
+
+    async def run():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await fetcher.fetch_many(keys)
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    return {"keys": len(keys), "concurrency": concurrency, **latency_summary(asyncio.run(run()))}
+
+
+def run_size(n_objects: int, args) -> dict:
+    fake = SyntheticS3(
+        n_objects,
+        users=args.users,
+        model_configs=args.model_configs,
+        days=args.days,
+        skew=args.skew,
+        latency=args.latency_ms / 1000,
+        seed=args.seed,
+    )
+    result = {"objects": n_objects}
+
+    started = time.perf_counter()
+    harvest = harvest_tags(fake, BUCKET, fake.prefix, max_workers=args.workers, progress_every=0)
+    result["refresh_s"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    index = TagIndex.build(harvest.entries, INDEXED_TAGS)
+    result["build_s"] = round(time.perf_counter() - started, 3)
+    del harvest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tag_index.snap")
+        started = time.perf_counter()
+        write_snapshot(index, path)
+        result["snapshot_write_s"] = round(time.perf_counter() - started, 3)
+        result["snapshot_bytes"] = os.path.getsize(path)
+
+        started = time.perf_counter()
+        mapped = open_snapshot(path)
+        result["snapshot_load_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        queries = representative_queries(fake)
+        result["queries_in_memory"] = bench_queries(index, queries, args.repeat)
+        result["queries_mapped"] = bench_queries(mapped, queries, args.repeat)
+
+        if args.churn:
+            fake.mutate(args.churn, delete_fraction=args.churn / 10, seed=args.seed + 1)
+            started = time.perf_counter()
+            delta = harvest_tags(fake, BUCKET, fake.prefix, previous=mapped.meta,
+                                 max_workers=args.workers, progress_every=0)
+            mapped.apply_delta(delta.changed, delta.removed)
+            result["incremental_refresh_s"] = round(time.perf_counter() - started, 3)
+            result["incremental_fetched"] = len(delta.changed)
+
+        result["fetch_page"] = bench_fetch(mapped, fake, args.fetch_concurrency, max(1, args.repeat // 20))
+
+    # ru_maxrss is KiB on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tag index refresh, snapshot load and queries")
+    parser.add_argument("--objects", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--model-configs", type=int, default=5)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for user_id/model_config")
+    parser.add_argument("--workers", type=int, default=32, help="tag harvest workers")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated per-call S3 latency")
+    parser.add_argument("--fetch-concurrency", type=int, default=32)
+    parser.add_argument("--churn", type=float, default=0.01, help="fraction re-written before the incremental refresh")
+    parser.add_argument("--repeat", type=int, default=200, help="runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results")
+    args = parser.parse_args()
+
+    runs = []
+    for n_objects in args.objects:
+        # Fresh process per size so peak RSS isn't inherited from the previous run
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            run = pool.submit(run_size, n_objects, args).result()
+        runs.append(run)
+        print(
+            f"{n_objects:>9} objects: refresh {run['refresh_s']}s, build {run['build_s']}s, "
+            f"load {run['snapshot_load_ms']}ms, peak RSS {run['peak_rss_mb']}MB"
+        )
+        for name, stats in run["queries_mapped"].items():
+            print(f"    {name:<24} {stats['matched']:>9} matched  p50 {stats['p50_ms']}ms  p99 {stats['p99_ms']}ms")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"index-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "runs": runs,
+        }, f, indent=2)
+    print(f"Saved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
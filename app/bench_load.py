@@ -0,0 +1,284 @@
+# Load test for the SSE MCP server: N concurrent MCP clients call the tools
+# in a weighted mix against a local server backed by the synthetic bucket:
+#
+#   python bench_load.py --objects 100000 --clients 50 --duration 60 \
+#       --mix filter_s3_user_violations=6,aggregate_s3_violations=2,add_numbers=2
+#
+# The server is started in a subprocess (python bench_load.py --serve ...)
+# unless --url points at one that is already running. Results, including
+# the server's RSS over time, go to bench_results/load-<timestamp>.json.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+
+from bench_index import percentile
+from fake_s3 import SyntheticS3
+
+DEFAULT_MIX = "filter_s3_user_violations=5,aggregate_s3_violations=2,fetch_s3_violation_contents=1,add_numbers=2"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        tool, _, weight = part.partition("=")
+        weights[tool.strip()] = float(weight or 1)
+    return weights
+
+
+def make_fake(args) -> SyntheticS3:
+    return SyntheticS3(
+        args.objects, users=args.users, days=args.days, body_bytes=args.body_bytes,
+        latency=args.s3_latency_ms / 1000, seed=args.seed,
+    )
+
+
+def tool_arguments(tool: str, rng: random.Random, fake: SyntheticS3) -> dict:
+    """Arguments an agent would plausibly send; tag values are drawn from real objects, so they follow the skew."""
+    tags = fake.tags(rng.randrange(fake.n_objects))
+    if tool == "add_numbers":
+        return {"a": rng.uniform(0, 100), "b": rng.uniform(0, 100)}
+    if tool == "filter_s3_user_violations":
+        filters = rng.choice([
+            {"user_id": tags["user_id"]},
+            {"user_id": tags["user_id"], "model_config": tags["model_config"]},
+            {"model_config": tags["model_config"], "year": tags["year"], "month": tags["month"]},
+        ])
+        return {**filters, "limit": 25, "include_content": rng.random() < 0.5}
+    if tool == "aggregate_s3_violations":
+        return {"group_by": [rng.choice(["user_id", "model_config", "date"])], "model_config": tags["model_config"]}
+    if tool == "fetch_s3_violation_contents":
+        return {"s3_keys": [fake.key(rng.randrange(fake.n_objects)) for _ in range(5)]}
+    if tool == "search_s3_violations":
+        return {"query": "prompt injection", "user_id": tags["user_id"]}
+    if tool == "get_weather":
+        return {"lat": round(rng.uniform(-60, 60), 3), "lon": round(rng.uniform(-180, 180), 3)}
+    return {}
+
+
+def read_rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+# -- server side ------------------------------------------------------------
+
+def serve(args):
+    """Runs mcp_server's app against the synthetic bucket (the parent sets the env first)."""
+    import uvicorn
+
+    import mcp_server
+    from object_fetch import ObjectFetcher
+    from tag_harvester import harvest_tags
+    from tag_index import TagIndex
+
+    fake = make_fake(args)
+    mcp_server.FETCHER = ObjectFetcher(
+        mcp_server.BUCKET_NAME, max_concurrency=mcp_server.FETCH_CONCURRENCY, cache=mcp_server.CONTENT_CACHE,
+        s3=fake, max_object_bytes=mcp_server.MAX_OBJECT_BYTES,
+    )
+    mcp_server.INDEX_FETCHER = ObjectFetcher(
+        mcp_server.BUCKET_NAME, max_concurrency=mcp_server.INDEX_FETCH_CONCURRENCY,
+        s3=fake, max_object_bytes=mcp_server.MAX_OBJECT_BYTES,
+    )
+    harvest = harvest_tags(fake, mcp_server.BUCKET_NAME, fake.prefix, max_workers=32, progress_every=0)
+    mcp_server.commit_index(TagIndex.build(harvest.entries, mcp_server.INDEXED_TAGS))
+    uvicorn.run(mcp_server.mcp.sse_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def start_server(args, tmp: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "TAG_INDEX_SNAPSHOT": os.path.join(tmp, "tag_index.snap"),
+        "TAG_INDEX_REFRESH_ON_START": "0",
+        "CONTENT_CACHE_DIR": "",
+    }
+    cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(args.port),
+           "--objects", str(args.objects), "--users", str(args.users), "--days", str(args.days),
+           "--body-bytes", str(args.body_bytes), "--s3-latency-ms", str(args.s3_latency_ms), "--seed", str(args.seed)]
+    return subprocess.Popen(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_ready(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/ready")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"{base_url} did not become ready within {timeout}s")
+
+
+# -- client side ------------------------------------------------------------
+
+async def client_loop(client_id: int, url: str, mix: dict, fake: SyntheticS3, deadline: float, stats: dict, think: float):
+    rng = random.Random(client_id)
+    tools, weights = list(mix), list(mix.values())
+    try:
+        async with sse_client(url) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                while time.monotonic() < deadline:
+                    tool = rng.choices(tools, weights)[0]
+                    started = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, tool_arguments(tool, rng, fake))
+                        failed = result.isError
+                    except Exception:
+                        failed = True
+                    elapsed = time.perf_counter() - started
+                    stats["latencies"].setdefault(tool, []).append(elapsed)
+                    stats["calls"] += 1
+                    if failed:
+                        stats["errors"][tool] = stats["errors"].get(tool, 0) + 1
+                    if think:
+                        await asyncio.sleep(rng.expovariate(1 / think))
+    except Exception as e:
+        stats["session_errors"].append(f"client {client_id}: {type(e).__name__}: {e}")
+
+
+async def sample_server(pid, stats: dict, interval: float, stop: asyncio.Event):
+    """Server RSS and cumulative calls / errors every `interval` seconds."""
+    started = time.monotonic()
+    while not stop.is_set():
+        stats["timeline"].append({
+            "t": round(time.monotonic() - started, 1),
+            "rss_mb": read_rss_mb(pid) if pid else None,
+            "calls": stats["calls"],
+            "errors": sum(stats["errors"].values()),
+        })
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args, url: str, server_pid) -> dict:
+    mix = parse_mix(args.mix)
+    fake = make_fake(args)
+    stats = {"calls": 0, "latencies": {}, "errors": {}, "session_errors": [], "timeline": []}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(server_pid, stats, args.sample_seconds, stop))
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(
+        client_loop(i, url, mix, fake, deadline, stats, args.think_ms / 1000) for i in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    all_latencies = [s for samples in stats["latencies"].values() for s in samples]
+
+    def summary(samples):
+        if not samples:
+            return {}
+        return {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        }
+
+    return {
+        "clients": args.clients,
+        "duration_s": round(elapsed, 2),
+        "calls": stats["calls"],
+        "throughput_per_s": round(stats["calls"] / elapsed, 1) if elapsed else 0.0,
+        "errors": sum(stats["errors"].values()),
+        "overall": summary(all_latencies),
+        "tools": {
+            tool: {**summary(samples), "errors": stats["errors"].get(tool, 0)}
+            for tool, samples in stats["latencies"].items()
+        },
+        "session_errors": stats["session_errors"][:20],
+        "timeline": stats["timeline"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the SSE MCP server with simulated MCP clients")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="tool=weight,... call mix")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a client's calls")
+    parser.add_argument("--url", default=None, help="SSE URL of a running server; default starts a local one")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID to sample RSS from with --url")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--objects", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--body-bytes", type=int, default=2048)
+    parser.add_argument("--s3-latency-ms", type=float, default=5.0, help="simulated per-call S3 latency")
+    parser.add_argument("--sample-seconds", type=float, default=1.0)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        url, pid = args.url, args.server_pid
+        if url is None:
+            server = start_server(args, tmp)
+            url, pid = f"http://127.0.0.1:{args.port}/sse", server.pid
+        try:
+            asyncio.run(wait_ready(url.rsplit("/sse", 1)[0], args.ready_timeout))
+            result = asyncio.run(run_load(args, url, pid))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print(
+        f"{result['clients']} clients, {result['duration_s']}s: {result['calls']} calls, "
+        f"{result['throughput_per_s']}/s, {result['errors']} errors, "
+        f"p50 {result['overall'].get('p50_ms')}ms p95 {result['overall'].get('p95_ms')}ms "
+        f"p99 {result['overall'].get('p99_ms')}ms"
+    )
+    for tool, stats in result["tools"].items():
+        print(f"    {tool:<30} {stats['count']:>7} calls  p50 {stats['p50_ms']}ms  p99 {stats['p99_ms']}ms  {stats['errors']} errors")
+    rss = [point["rss_mb"] for point in result["timeline"] if point["rss_mb"] is not None]
+    if rss:
+        print(f"    server RSS {rss[0]}MB -> {rss[-1]}MB (peak {max(rss)}MB)")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "result": result,
+        }, f, indent=2)
+    print(f"Saved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+
+class ContentCache:
+    """
+    Two-tier cache for decoded object contents, keyed by (s3_key, etag).
+
+    Tier 1 is an in-memory LRU bounded by `max_bytes` of UTF-8 content.
+    Tier 2 is an optional directory on disk that survives restarts, bounded
+    by `disk_max_bytes` of files: the least recently used ones (by mtime,
+    which a disk hit refreshes) are deleted first. Because the ETag is part
+    of the key, an object that changes in S3 simply stops matching once the
+    index refresh records its new ETag; the stale copy is replaced the next
+    time the key is stored.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, cache_dir: str = None, disk_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # (s3_key, etag) -> (content, size)
+        self._bytes = 0
+        self._disk = OrderedDict()  # file path -> size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        """Rebuilds the disk LRU from the files a previous run left, oldest mtime first."""
+        files = []
+        for key_dir, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(key_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp"):
+                    os.remove(path)  # left by an interrupted write
+                    continue
+                files.append((st.st_mtime_ns, path, st.st_size))
+        for _, path, size in sorted(files):
+            self._disk[path] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _disk_paths(self, key: str, etag: str):
+        key_dir = os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest())
+        return key_dir, os.path.join(key_dir, hashlib.sha256(etag.encode("utf-8")).hexdigest()[:32])
+
+    def get(self, key: str, etag: str):
+        if not etag:
+            return None
+        with self._lock:
+            item = self._entries.get((key, etag))
+            if item is not None:
+                self._entries.move_to_end((key, etag))
+                self.hits += 1
+                return item[0]
+
+        content = self._read_disk(key, etag)
+        with self._lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, etag, content)
+        return content
+
+    def put(self, key: str, etag: str, content: str):
+        if not etag:
+            return
+        self._remember(key, etag, content)
+        self._write_disk(key, etag, content)
+
+    def _remember(self, key: str, etag: str, content: str):
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((key, etag), None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[(key, etag)] = (content, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _read_disk(self, key: str, etag: str):
+        if not self.cache_dir:
+            return None
+        _, path = self._disk_paths(key, etag)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # keeps the LRU order across restarts
+        except OSError:
+            pass
+        with self._lock:
+            if path in self._disk:
+                self._disk.move_to_end(path)
+        return content
+
+    def _write_disk(self, key: str, etag: str, content: str):
+        if not self.cache_dir:
+            return
+        encoded = content.encode("utf-8")
+        if len(encoded) > self.disk_max_bytes:
+            return
+        key_dir, path = self._disk_paths(key, etag)
+        try:
+            os.makedirs(key_dir, exist_ok=True)
+            # Only the newest version of a key is kept on disk
+            for name in os.listdir(key_dir):
+                if not name.endswith(".tmp") and os.path.join(key_dir, name) != path:
+                    os.remove(os.path.join(key_dir, name))
+                    self._forget_disk(os.path.join(key_dir, name))
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encoded)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write {key} to the content cache: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(encoded) - self._disk.pop(path, 0)
+            self._disk[path] = len(encoded)
+        self._evict_disk()
+
+    def _forget_disk(self, path: str):
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(path, 0)
+
+    def _evict_disk(self):
+        """Deletes least recently used files until the disk tier fits disk_max_bytes."""
+        evicted = []
+        with self._lock:
+            while self._disk_bytes > self.disk_max_bytes and self._disk:
+                path, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.disk_evictions += 1
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.remove(path)
+                os.rmdir(os.path.dirname(path))  # fails, harmlessly, while a newer version is being written
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_evictions": self.disk_evictions,
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes if self.cache_dir else None,
+            }
@@ -0,0 +1,172 @@
+import io
+import random
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+
+from botocore.exceptions import ClientError
+
+
+class SyntheticS3:
+    """
+    Deterministic, storage-free stand-in for the handful of boto3 S3 calls
+    this app makes (list_objects_v2 paging, get_object_tagging, get_object,
+    head_object). Object i is generated on demand from `seed`, so two
+    instances with the same arguments describe the same bucket, even in
+    different processes.
+
+    Tag cardinality and skew are configurable: user_id and model_config are
+    drawn from Zipf-like distributions (weight 1 / rank**skew) and the date
+    is spread uniformly over `days` days from `start_date`. `latency` adds a
+    sleep per call and `throttle_rate` makes that fraction of calls fail with
+    SlowDown, to exercise concurrency and backoff.
+    """
+
+    def __init__(
+        self,
+        n_objects: int,
+        prefix: str = "llm-dev/security_data/",
+        users: int = 1000,
+        model_configs: int = 5,
+        days: int = 365,
+        skew: float = 1.1,
+        start_date: str = "2025-01-01",
+        body_bytes: int = 512,
+        latency: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.n_objects = n_objects
+        self.prefix = prefix
+        self.users = users
+        self.model_configs = model_configs
+        self.days = days
+        self.start_date = date.fromisoformat(start_date)
+        self.body_bytes = body_bytes
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self.versions = {}  # object number -> version, bumped by mutate()
+        self.deleted = set()
+        self.calls = {}  # operation -> count
+        self._calls_lock = threading.Lock()
+        self._user_weights = list(accumulate(1 / (rank ** skew) for rank in range(1, users + 1)))
+        self._config_weights = list(accumulate(1 / (rank ** skew) for rank in range(1, model_configs + 1)))
+        self._modified = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    # -- synthetic bucket contents ------------------------------------------
+
+    def key(self, i: int) -> str:
+        return f"{self.prefix}violation-{i:08d}.json"
+
+    def _number(self, key: str) -> int:
+        if not key.startswith(self.prefix) or not key.endswith(".json"):
+            return -1
+        try:
+            i = int(key[len(self.prefix) + len("violation-"):-len(".json")])
+        except ValueError:
+            return -1
+        return i if 0 <= i < self.n_objects and i not in self.deleted else -1
+
+    def _pick(self, rng, cumulative: list) -> int:
+        return bisect_left(cumulative, rng.random() * cumulative[-1])
+
+    def tags(self, i: int) -> dict:
+        rng = random.Random(self.seed * 1_000_003 + i * 7919 + self.versions.get(i, 0))
+        day = self.start_date + timedelta(days=rng.randrange(self.days))
+        return {
+            "model_config": f"test{self._pick(rng, self._config_weights) + 1}",
+            "user_id": f"user{self._pick(rng, self._user_weights) + 1:05d}@example.com",
+            "year": str(day.year),
+            "month": f"{day.month:02d}",
+            "day": f"{day.day:02d}",
+        }
+
+    def body(self, i: int) -> bytes:
+        tags = self.tags(i)
+        line = f"violation {i} by {tags['user_id']} on {tags['model_config']}: prompt injection attempt detected\n"
+        # ASCII only, so exactly body_bytes bytes
+        return (line * (self.body_bytes // len(line) + 1))[:self.body_bytes].encode("ascii")
+
+    def etag(self, i: int) -> str:
+        return f'"{self.seed:04x}{i:08x}{self.versions.get(i, 0):04x}"'
+
+    def mutate(self, fraction: float, delete_fraction: float = 0.0, seed: int = 1):
+        """Simulates churn: re-writes (new ETag and tags) and deletes a random share of objects."""
+        rng = random.Random(seed)
+        live = [i for i in range(self.n_objects) if i not in self.deleted]
+        for i in rng.sample(live, int(len(live) * fraction)):
+            self.versions[i] = self.versions.get(i, 0) + 1
+        for i in rng.sample(live, int(len(live) * delete_fraction)):
+            self.deleted.add(i)
+
+    # -- boto3 client surface -----------------------------------------------
+
+    def _call(self, operation: str, throttle: bool = True):
+        with self._calls_lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle and self.throttle_rate and random.random() < self.throttle_rate:
+            raise ClientError({"Error": {"Code": "SlowDown", "Message": "Please reduce your request rate."}}, operation)
+
+    def _require(self, key: str, operation: str) -> int:
+        i = self._number(key)
+        if i < 0:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": key}}, operation)
+        return i
+
+    def _listing(self, i: int) -> dict:
+        return {
+            "Key": self.key(i),
+            "ETag": self.etag(i),
+            "LastModified": self._modified + timedelta(seconds=self.versions.get(i, 0)),
+            "Size": self.body_bytes,
+        }
+
+    def get_paginator(self, operation: str):
+        if operation != "list_objects_v2":
+            raise NotImplementedError(operation)
+        return _ListPaginator(self)
+
+    def get_object_tagging(self, Bucket: str, Key: str) -> dict:
+        self._call("GetObjectTagging")
+        i = self._require(Key, "GetObjectTagging")
+        return {"TagSet": [{"Key": k, "Value": v} for k, v in self.tags(i).items()]}
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        self._call("HeadObject")
+        i = self._require(Key, "HeadObject")
+        listing = self._listing(i)
+        return {"ETag": listing["ETag"], "LastModified": listing["LastModified"], "ContentLength": listing["Size"]}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        self._call("GetObject")
+        i = self._require(Key, "GetObject")
+        body = self.body(i)
+        return {"Body": io.BytesIO(body), "ETag": self.etag(i), "ContentLength": len(body)}
+
+
+class _ListPaginator:
+    def __init__(self, s3: SyntheticS3):
+        self.s3 = s3
+
+    def paginate(self, Bucket: str, Prefix: str = "", PaginationConfig: dict = None):
+        s3 = self.s3
+        page_size = (PaginationConfig or {}).get("PageSize", 1000)
+        if not s3.prefix.startswith(Prefix) and not Prefix.startswith(s3.prefix):
+            return
+        page = []
+        # Zero-padded object numbers, so numeric order is key order, like S3
+        for i in range(s3.n_objects):
+            if i in s3.deleted or not s3.key(i).startswith(Prefix):
+                continue
+            page.append(s3._listing(i))
+            if len(page) == page_size:
+                s3._call("ListObjectsV2", throttle=False)
+                yield {"Contents": page, "KeyCount": len(page)}
+                page = []
+        s3._call("ListObjectsV2", throttle=False)
+        yield {"Contents": page, "KeyCount": len(page)}
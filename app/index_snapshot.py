@@ -0,0 +1,199 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+from tag_index import TagIndex
+
+# Snapshot layout (little-endian):
+#
+#   header    MAGIC, version, key count, generation, built_at,
+#             then (offset, length) for each of the sections below
+#   keys      string table of s3 keys, sorted, position = key ID
+#   meta      string table of compact JSON entries, same order as keys
+#   directory JSON {tag: {value: [posting offset, count]}}, plus the column order
+#   postings  uint32 key IDs, one sorted run per tag value
+#   columns   uint32 per key per tag: 1 + value position in the directory
+#
+# A string table is: u64 count, u64 offsets[count + 1], utf-8 blob.
+# Integer arrays are cast straight out of the mapping, so snapshots are
+# only read and written on little-endian hosts.
+MAGIC = b"S3TAGIDX"
+VERSION = 2
+SECTIONS = ("keys", "meta", "directory", "postings", "columns")
+HEADER = struct.Struct("<8sIIQd" + "QQ" * len(SECTIONS))
+U64 = struct.Struct("<Q")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def pack_blob_table(blobs: list) -> bytes:
+    offsets = array("Q", [0])
+    for b in blobs:
+        offsets.append(offsets[-1] + len(b))
+    return U64.pack(len(blobs)) + offsets.tobytes() + b"".join(blobs)
+
+
+def pack_string_table(strings: list) -> bytes:
+    return pack_blob_table([s.encode("utf-8") for s in strings])
+
+
+def align_sections(sections: list, start: int) -> list:
+    """[offset, length, ...] for `sections` laid out from `start`, each 8-byte aligned."""
+    offset = start
+    table = []
+    for body in sections:
+        # keep every section 8-byte aligned so the memoryview casts line up
+        offset += -offset % 8
+        table += [offset, len(body)]
+        offset += len(body)
+    return table
+
+
+def write_sections(path: str, header: bytes, sections: list, table: list):
+    """
+    Writes header + aligned sections to `path` atomically (temp file +
+    rename). A section is bytes, or an object with len() and write_to(f)
+    for sections spooled to disk while they were built.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        for section_offset, body in zip(table[::2], sections):
+            f.write(b"\0" * (section_offset - f.tell()))
+            if isinstance(body, (bytes, bytearray)):
+                f.write(body)
+            else:
+                body.write_to(f)
+    os.replace(tmp_path, path)
+
+
+def map_file(path: str) -> memoryview:
+    if sys.byteorder != "little":
+        raise SnapshotError("tag index snapshots require a little-endian host")
+    with open(path, "rb") as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class MappedStrings(Sequence):
+    """Read-only view of a string table; strings are decoded on access."""
+
+    def __init__(self, buf: memoryview):
+        (self._count,) = U64.unpack_from(buf, 0)
+        self._offsets = buf[8:8 + 8 * (self._count + 1)].cast("Q")
+        self._blob = buf[8 + 8 * (self._count + 1):]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return str(self.raw(i), "utf-8")
+
+    def raw(self, i: int) -> memoryview:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+
+class MappedMeta(Mapping):
+    """s3_key -> entry, decoding one JSON entry per lookup."""
+
+    def __init__(self, keys: MappedStrings, entries: MappedStrings, index: TagIndex):
+        self._keys = keys
+        self._entries = entries
+        self._index = index
+
+    def __getitem__(self, key):
+        key_id = self._index.key_id(key)
+        if key_id is None:
+            raise KeyError(key)
+        return json.loads(self._entries[key_id])
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def values(self):
+        return (json.loads(e) for e in self._entries)
+
+
+def write_snapshot(index: TagIndex, path: str):
+    """Writes `index` to `path` atomically (temp file + rename)."""
+    if sys.byteorder != "little":
+        raise SnapshotError("tag index snapshots require a little-endian host")
+    keys = list(index.keys)
+    meta = [json.dumps(index.meta[key], separators=(",", ":")) for key in keys]
+
+    directory = {}
+    postings = array("I")
+    for tag, values in index.lookup.items():
+        directory[tag] = {}
+        for value, ids in values.items():
+            directory[tag][value] = [len(postings), len(ids)]
+            postings.extend(ids)
+
+    column_tags = list(index.lookup)
+    columns = b"".join(index.column(tag)[1].tobytes() for tag in column_tags)
+
+    sections = [
+        pack_string_table(keys),
+        pack_string_table(meta),
+        json.dumps(
+            {"tags": index.tags, "values": directory, "columns": column_tags}, separators=(",", ":")
+        ).encode("utf-8"),
+        postings.tobytes(),
+        columns,
+    ]
+
+    table = align_sections(sections, HEADER.size)
+    header = HEADER.pack(MAGIC, VERSION, len(keys), index.generation, index.built_at, *table)
+    write_sections(path, header, sections, table)
+
+
+def open_snapshot(path: str) -> TagIndex:
+    """
+    Memory-maps a snapshot and returns a TagIndex backed by it. Only the
+    small tag/value directory is parsed up front; keys, metadata and
+    posting lists stay in the mapping and are read on demand.
+    """
+    buf = map_file(path)
+    if len(buf) < HEADER.size:
+        raise SnapshotError(f"{path} is truncated")
+    magic, version = struct.unpack_from("<8sI", buf, 0)
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} is not a tag index snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"{path} has snapshot version {version}, expected {VERSION}")
+    _, _, n_keys, generation, built_at, *table = HEADER.unpack_from(buf, 0)
+
+    section = {name: buf[table[2 * i]:table[2 * i] + table[2 * i + 1]] for i, name in enumerate(SECTIONS)}
+    directory = json.loads(str(section["directory"], "utf-8"))
+    postings = section["postings"].cast("I")
+
+    lookup = {
+        tag: {value: postings[start:start + count] for value, (start, count) in values.items()}
+        for tag, values in directory["values"].items()
+    }
+
+    keys = MappedStrings(section["keys"])
+    if len(keys) != n_keys:
+        raise SnapshotError(f"{path} key table does not match its header")
+
+    words = section["columns"].cast("I")
+    columns = {tag: words[i * n_keys:(i + 1) * n_keys] for i, tag in enumerate(directory["columns"])}
+
+    index = TagIndex(keys, lookup, {}, directory["tags"], generation=generation, columns=columns)
+    index.meta = MappedMeta(keys, MappedStrings(section["meta"]), index)
+    index.built_at = built_at
+    return index
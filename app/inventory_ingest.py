@@ -0,0 +1,306 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, unquote_plus
+
+from tag_index import TagIndex
+
+# Rows handed from the reader thread to the indexer per queue item
+BATCH_SIZE = 5000
+_DONE = object()
+
+# Parquet / ORC inventories name their columns in snake case; rows are
+# renamed to the CSV fileSchema names the rest of this module reads
+COLUMNAR_NAMES = {
+    "bucket": "Bucket",
+    "key": "Key",
+    "size": "Size",
+    "last_modified_date": "LastModifiedDate",
+    "e_tag": "ETag",
+    "tags": "Tags",
+}
+
+# An inventory index smaller than this fraction of the published one is not committed unless forced
+MIN_INVENTORY_RATIO = 0.5
+
+
+class InventoryShrinkError(ValueError):
+    pass
+
+
+def download_inventory(s3, manifest_uri: str, dest_dir: str) -> str:
+    """
+    Copies an inventory manifest ("s3://bucket/.../manifest.json") and its
+    data files into `dest_dir`, skipping files already there with the same
+    size. Returns the local manifest path.
+    """
+    bucket, _, manifest_key = manifest_uri[len("s3://"):].partition("/")
+    os.makedirs(dest_dir, exist_ok=True)
+
+    manifest_bytes = s3.get_object(Bucket=bucket, Key=manifest_key)["Body"].read()
+    manifest = json.loads(manifest_bytes)
+    manifest_path = os.path.join(dest_dir, "manifest.json")
+    with open(manifest_path, "wb") as f:
+        f.write(manifest_bytes)
+
+    data_bucket = manifest.get("destinationBucket", bucket).split(":::")[-1]
+    for file in manifest["files"]:
+        local_path = os.path.join(dest_dir, os.path.basename(file["key"]))
+        if os.path.exists(local_path) and os.path.getsize(local_path) == file.get("size"):
+            continue
+        s3.download_file(data_bucket, file["key"], local_path)
+        logging.info(f"Downloaded inventory file {file['key']}")
+    return manifest_path
+
+
+def _parse_tags(raw) -> dict:
+    """
+    Tags as a URL-encoded query string (k=v&k2=v2, as in x-amz-tagging) or a
+    JSON object, or from a columnar file a map ([(k, v), ...]) or a list of
+    {"key": k, "value": v} structs.
+    """
+    if not raw:
+        return {}
+    if isinstance(raw, dict):
+        return dict(raw)
+    if isinstance(raw, list):
+        return dict((tag["key"], tag["value"]) if isinstance(tag, dict) else tag for tag in raw)
+    raw = raw.strip()
+    if raw.startswith("{"):
+        return json.loads(raw)
+    return dict(parse_qsl(raw, keep_blank_values=True))
+
+
+def _normalize_etag(etag):
+    # Inventory ETags are bare hex; list_objects_v2 quotes them
+    if etag and not etag.startswith('"'):
+        return f'"{etag}"'
+    return etag
+
+
+def _normalize_timestamp(value):
+    # Match the isoformat() of the datetimes boto3 returns, so an incremental
+    # API refresh after an inventory load sees these keys as unchanged
+    if not value:
+        return value
+    if isinstance(value, datetime):
+        # Parquet / ORC timestamps; inventories record them in UTC
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.replace(microsecond=0).isoformat()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(microsecond=0).isoformat()
+    except ValueError:
+        return value
+
+
+def _to_entry(record: dict, prefix: str):
+    key = record.get("Key")
+    if not key or key.endswith("/") or not key.startswith(prefix):
+        return None
+    entry = _parse_tags(record.get("Tags"))
+    entry["s3_key"] = key
+    entry["etag"] = _normalize_etag(record.get("ETag"))
+    entry["last_modified"] = _normalize_timestamp(record.get("LastModifiedDate"))
+    size = record.get("Size")
+    entry["size"] = int(size) if size not in (None, "") else None
+    return entry
+
+
+def _csv_batches(path: str, columns: list):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="", encoding="utf-8") as f:
+        batch = []
+        for row in csv.reader(f):
+            record = dict(zip(columns, row))
+            # CSV inventory keys are URL-encoded
+            record["Key"] = unquote_plus(record.get("Key", ""))
+            batch.append(record)
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _columnar_batches(path: str, file_format: str):
+    try:
+        import pyarrow.orc as orc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError(f"Reading {file_format} inventories requires pyarrow (pip install pyarrow)")
+
+    if file_format == "Parquet":
+        batches = pq.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE)
+    else:
+        reader = orc.ORCFile(path)
+        batches = (reader.read_stripe(i) for i in range(reader.nstripes))
+    for batch in batches:
+        yield [{COLUMNAR_NAMES.get(name, name): value for name, value in row.items()} for row in batch.to_pylist()]
+
+
+def iter_inventory_records(manifest_path: str):
+    """Yields lists of inventory rows (dicts keyed by the manifest's fileSchema) file by file."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    file_format = manifest.get("fileFormat", "CSV")
+    columns = [c.strip() for c in manifest.get("fileSchema", "").split(",")]
+
+    for file in manifest["files"]:
+        path = os.path.join(base_dir, os.path.basename(file["key"]))
+        if file_format == "CSV":
+            yield from _csv_batches(path, columns)
+        elif file_format in ("Parquet", "ORC"):
+            yield from _columnar_batches(path, file_format)
+        else:
+            raise ValueError(f"Unsupported inventory format: {file_format}")
+
+
+def _read_ahead(batches, max_batches: int = 8):
+    """
+    Runs `batches` on a reader thread so decompression and parsing of the
+    next file chunk overlap with indexing the current one.
+    """
+    q = queue.Queue(maxsize=max_batches)
+
+    def reader():
+        try:
+            for batch in batches:
+                q.put(batch)
+        except Exception as e:
+            q.put(e)
+        finally:
+            q.put(_DONE)
+
+    threading.Thread(target=reader, name="inventory-reader", daemon=True).start()
+    while True:
+        item = q.get()
+        if item is _DONE:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+class _JsonListWriter:
+    """Streams entries into a flat tag_index.json without holding the list in memory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.f = open(self.tmp_path, "w")
+        self.f.write("[")
+        self.first = True
+
+    def write(self, entry: dict):
+        self.f.write("\n  " if self.first else ",\n  ")
+        json.dump(entry, self.f)
+        self.first = False
+
+    def close(self):
+        self.f.write("\n]\n")
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.tmp_path)
+
+
+def check_inventory_index(new_index: TagIndex, current: TagIndex, min_ratio: float = MIN_INVENTORY_RATIO):
+    """
+    Raises InventoryShrinkError if `new_index` is empty or has fewer than
+    `min_ratio` times the keys of `current`. That is almost always a schema
+    the reader did not understand or a partial inventory, and committing it
+    would replace a good index.
+    """
+    if not len(new_index):
+        raise InventoryShrinkError("The inventory produced an empty index; check its columns and prefix")
+    if len(new_index) < min_ratio * len(current):
+        raise InventoryShrinkError(
+            f"The inventory produced {len(new_index)} keys against {len(current)} in the current index"
+        )
+
+
+def ingest_inventory(
+    manifest_path: str, tags: list, prefix: str = "", json_path: str = None, current: TagIndex = None
+) -> TagIndex:
+    """
+    Builds a TagIndex from a local inventory manifest in a single streaming
+    pass, optionally writing the flat tag_index.json alongside. Only keys
+    under `prefix` are indexed. With `current`, the result goes through
+    check_inventory_index first, and tag_index.json is only kept if it
+    passes.
+
+    The data files need a Tags column. AWS S3 Inventory reports do not
+    include object tags, so the manifest has to come from an export that
+    adds them (e.g. an inventory joined with tags by a batch job).
+    """
+    writer = _JsonListWriter(json_path) if json_path else None
+    counts = {"rows": 0, "indexed": 0}
+
+    def entries():
+        for batch in _read_ahead(iter_inventory_records(manifest_path)):
+            for record in batch:
+                counts["rows"] += 1
+                entry = _to_entry(record, prefix)
+                if entry is None:
+                    continue
+                counts["indexed"] += 1
+                if writer:
+                    writer.write(entry)
+                yield entry
+
+    try:
+        index = TagIndex.build(entries(), tags)
+        if current is not None:
+            check_inventory_index(index, current)
+    except Exception:
+        if writer:
+            writer.abort()
+        raise
+    if writer:
+        writer.close()
+    logging.info(f"Ingested {counts['rows']} inventory rows, indexed {counts['indexed']} keys from {manifest_path}")
+    return index
+
+
+if __name__ == "__main__":
+    # Offline build of the server's snapshot from an inventory:
+    #   python inventory_ingest.py --manifest s3://inventory-bucket/.../manifest.json --dest inventory/
+    import argparse
+
+    from index_snapshot import open_snapshot, write_snapshot
+    from tag_harvester import make_s3_client
+
+    parser = argparse.ArgumentParser(description="Build the tag index snapshot from an S3 Inventory style manifest")
+    parser.add_argument("--manifest", required=True, help="local manifest.json or s3://bucket/key/manifest.json")
+    parser.add_argument("--dest", default="inventory", help="where s3:// manifests and data files are stored")
+    parser.add_argument("--prefix", default="llm-dev/security_data/")
+    parser.add_argument("--tags", default="model_config,user_id,year,month,day")
+    parser.add_argument("--snapshot", default="tag_index.snap")
+    parser.add_argument("--json", default=None, help="also write a flat tag_index.json here")
+    parser.add_argument("--force", action="store_true", help="write the snapshot even if it is empty or far smaller than the current one")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    manifest_path = args.manifest
+    if manifest_path.startswith("s3://"):
+        manifest_path = download_inventory(make_s3_client(), manifest_path, args.dest)
+    tags = args.tags.split(",")
+    current = None
+    if not args.force:
+        current = open_snapshot(args.snapshot) if os.path.exists(args.snapshot) else TagIndex.empty(tags)
+    try:
+        built = ingest_inventory(manifest_path, tags, prefix=args.prefix, json_path=args.json, current=current)
+    except InventoryShrinkError as e:
+        not_written = f"{args.snapshot} or {args.json}" if args.json else args.snapshot
+        parser.exit(1, f"{e}. Not writing {not_written}; use --force to write it anyway.\n")
+    write_snapshot(built, args.snapshot)
+    print(f"Wrote {len(built)} keys to {args.snapshot}")
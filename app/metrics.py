@@ -0,0 +1,184 @@
+import math
+import threading
+from bisect import bisect_left
+
+# Seconds; covers an in-memory index query up to a slow page of S3 fetches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination. inc() is a dict update under a lock."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name, label_values, "", value
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label combination, as Prometheus expects.
+    observe() is a bisect and two additions under a lock, cheap enough for
+    every tool call.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (last = +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_values: tuple = ()):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def dump(self) -> list:
+        """The series as JSON-able data, for load() in another process."""
+        with self._lock:
+            return [
+                {"labels": list(label_values), "counts": list(counts), "sum": total}
+                for label_values, (counts, total) in self._series.items()
+            ]
+
+    def load(self, series: list):
+        """Replaces every series with a dump() taken elsewhere, e.g. by the process that does the work."""
+        loaded = {tuple(s["labels"]): [list(s["counts"]), s["sum"]] for s in series}
+        with self._lock:
+            self._series = loaded
+
+    def samples(self):
+        with self._lock:
+            items = [(label_values, list(counts), total) for label_values, (counts, total) in self._series.items()]
+        for label_values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", label_values, f'le="{_format_value(bound)}"', cumulative
+            yield f"{self.name}_sum", label_values, "", total
+            yield f"{self.name}_count", label_values, "", cumulative
+
+
+class CallbackMetric:
+    """
+    Gauge or counter read at scrape time from `fn`, which returns a number
+    or a {label values tuple: number} dict. Used for values other objects
+    already keep (index size, cache stats), so the hot path pays nothing.
+    """
+
+    def __init__(self, name: str, help: str, fn, labels: tuple = (), type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.type = type
+
+    def samples(self):
+        values = self.fn()
+        if values is None:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            if value is not None:
+                yield self.name, label_values, "", value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge_fn(self, name: str, help: str, fn, labels: tuple = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, labels))
+
+    def counter_fn(self, name: str, help: str, fn, labels: tuple = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, labels, type="counter"))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, label_values, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labels, label_values, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+S3_CALLS = REGISTRY.counter("s3_api_calls_total", "S3 API calls by operation", ("operation",))
+S3_ERRORS = REGISTRY.counter("s3_api_errors_total", "Failed S3 API calls by operation and error code", ("operation", "code"))
+
+
+def record_s3_call(http_response=None, parsed=None, model=None, **kwargs):
+    """botocore after-call handler: counts every S3 API call and its error code, if any."""
+    operation = model.name if model is not None else "unknown"
+    S3_CALLS.inc((operation,))
+    status = getattr(http_response, "status_code", 200)
+    if status >= 300 and status != 304:
+        code = (parsed or {}).get("Error", {}).get("Code") or str(status)
+        S3_ERRORS.inc((operation, code))
+
+
+def record_s3_exception(exception=None, event_name: str = "", **kwargs):
+    """botocore after-call-error handler: calls that failed without an HTTP response."""
+    operation = event_name.rsplit(".", 1)[-1] or "unknown"
+    S3_CALLS.inc((operation,))
+    S3_ERRORS.inc((operation, type(exception).__name__))
+
+
+def instrument_s3_client(client):
+    """Counts the calls (and errors) of a boto3 S3 client in S3_CALLS / S3_ERRORS."""
+    client.meta.events.register("after-call.s3", record_s3_call)
+    client.meta.events.register("after-call-error.s3", record_s3_exception)
+    return client
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from stream_decode import detect_encoding, head, read_text
+from tag_harvester import make_s3_client
+
+
+class ObjectFetcher:
+    """
+    Long-lived S3 reader shared by every tool call: one connection-pooled
+    client and one thread pool, so at most `max_concurrency` get_object
+    calls are in flight and none of them run on the event loop.
+
+    Bodies are streamed and decompressed (gzip / zstd) as they are read and
+    cut at `max_object_bytes` decoded bytes, so a huge object costs no more
+    memory than a small one.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        max_concurrency: int = 32,
+        endpoint_url: str = None,
+        cache=None,
+        s3=None,
+        max_object_bytes: int = 1024 * 1024,
+    ):
+        self.bucket = bucket
+        self.cache = cache  # optional ContentCache keyed by (s3_key, etag)
+        self.max_concurrency = max_concurrency
+        self.max_object_bytes = max_object_bytes
+        self.endpoint_url = endpoint_url
+        self._s3 = s3  # e.g. a SyntheticS3 stand-in; a real client is created lazily otherwise
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="s3-fetch")
+
+    @property
+    def s3(self):
+        # Created on first use so importing the server never needs AWS credentials
+        if self._s3 is None:
+            with self._lock:
+                if self._s3 is None:
+                    self._s3 = make_s3_client(self.max_concurrency, endpoint_url=self.endpoint_url)
+        return self._s3
+
+    def get_text(self, key: str, etag: str = None, head_lines: int = None, cache: bool = True) -> str:
+        """
+        Object contents as text, capped at max_object_bytes with a
+        truncation marker. `etag` is the one recorded in the index; when it
+        matches a cached copy S3 is not contacted at all. With `head_lines`
+        only the first lines are returned, and an uncached object is read
+        only that far. cache=False neither reads nor fills the content
+        cache, for bulk reads that would only flush it.
+        """
+        if cache and self.cache is not None:
+            content = self.cache.get(key, etag)
+            if content is not None:
+                return head(content, head_lines) if head_lines else content
+
+        response = self.s3.get_object(Bucket=self.bucket, Key=key)
+        encoding = detect_encoding(key, response.get('ContentEncoding'))
+        content, _ = read_text(response['Body'], encoding, max_bytes=self.max_object_bytes, head_lines=head_lines)
+        if head_lines:
+            return content  # partial, so not cached
+
+        if cache and self.cache is not None:
+            # Store under the ETag S3 actually served, not the possibly stale indexed one
+            self.cache.put(key, response.get('ETag') or etag, content)
+        return content
+
+    def get_many(self, keys: list, etags: list, cache: bool = True) -> list:
+        """Blocking counterpart of fetch_many() for background jobs such as index builds."""
+        futures = [self._executor.submit(self.get_text, key, etag, None, cache) for key, etag in zip(keys, etags)]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def fetch_many(self, keys: list, etags: list = None, head_lines: int = None) -> list:
+        """
+        Fetches `keys` concurrently. Results come back in the same order as
+        `keys`; a failed fetch yields its exception instead of the content.
+        """
+        etags = etags or [None] * len(keys)
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(self._executor, self.get_text, key, etag, head_lines)
+            for key, etag in zip(keys, etags)
+        ]
+        return await asyncio.gather(*futures, return_exceptions=True)
@@ -0,0 +1,86 @@
+import json
+import threading
+from collections import OrderedDict
+
+from single_flight import SingleFlight
+
+
+def approximate_size(result) -> int:
+    return len(json.dumps(result, default=str))
+
+
+class ResultCache:
+    """
+    LRU cache of tool results for the MCP server, bounded by the approximate
+    serialized size of the cached results.
+
+    Callers put the index generation in the cache key, so a reload makes
+    every older entry unreachable (publish_index also clears them). Misses
+    are single-flight (see SingleFlight): concurrent calls with the same key
+    await the one computation already running instead of starting their own.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, sizeof=approximate_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()  # clear() is called from the refresh thread
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.evictions = 0
+
+    async def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Cached result for `key`, else the result of `await compute()`. A
+        result for which `cacheable(result)` is false (e.g. one with failed
+        fetches) is handed to the waiting callers but not stored, so the
+        next call computes it again.
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return item[0]
+
+        async def compute_and_store():
+            # Stored from the shared task, so the result is kept even if its first caller was cancelled
+            result = await compute()
+            if cacheable is None or cacheable(result):
+                self._store(key, result)
+            return result
+
+        return await self._flights.run(key, compute_and_store)
+
+    def _store(self, key, result):
+        size = self.sizeof(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self._flights.started,
+                "coalesced": self._flights.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,41 +1,225 @@
-import boto3
-
-s3 = boto3.client('s3')
-
-bucket_name = 'romitestbucket07'
-prefix = 'llm-dev/security_data/'
-
-# Filter criteria
-filter_tags = {
-    'model_config': 'test1',
-    'user_id': 'rajarshi.maity@infosys.com'
-}
-
-# Initialize boto3 client
-s3 = boto3.client('s3')
-
-# Paginate through files under the prefix
-paginator = s3.get_paginator('list_objects_v2')
-page_iterator = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
-
-for page in page_iterator:
-    for obj in page.get('Contents', []):
-        key = obj['Key']
-        
-        # Skip if it's a folder marker
-        if key.endswith('/'):
-            continue
-
-        # Fetch tags
-        tagging = s3.get_object_tagging(Bucket=bucket_name, Key=key)
-        tags = {tag['Key']: tag['Value'] for tag in tagging['TagSet']}
-
-        # Match tags
-        if all(tags.get(k) == v for k, v in filter_tags.items()):
-            print(f"Matched file: s3://{bucket_name}/{key}")
-            
-            # Fetch and decode file contents
-            response = s3.get_object(Bucket=bucket_name, Key=key)
-            response_content = response['Body'].read().decode('utf-8')
-            
-            print("Contents:\n", response_content)
+# Exports the violation files matching tag filters, answered from the tag
+# index snapshot instead of a get_object_tagging call per object:
+#
+#   python s3_access.py --tag model_config=test1 --tag user_id=someone@example.com --out exports/
+#   python s3_access.py --tag model_config=test1 --date-from 2025-06-01 --jsonl exports/test1.jsonl
+#
+# Downloads run in parallel. Re-running the same export resumes it: files
+# already exported with the ETag the index has for them are skipped.
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+
+from index_snapshot import open_snapshot
+from stream_decode import detect_encoding, read_text
+from tag_harvester import make_s3_client
+
+BUCKET_NAME = 'romitestbucket07'
+MANIFEST_NAME = ".export-manifest.jsonl"  # key + ETag of every file completed in a directory export
+
+
+def select_keys(index, tags: dict, date_from: str = None, date_to: str = None) -> list:
+    """
+    Keys matching every tag=value and the date range. Indexed tags are
+    answered from the posting lists; any other tag is checked against the
+    stored metadata of those candidates, still without calling S3.
+    """
+    indexed = {tag: value for tag, value in tags.items() if tag in index.lookup}
+    others = {tag: value for tag, value in tags.items() if tag not in index.lookup}
+    if indexed or date_from or date_to:
+        keys = index.keys_for(index.match(indexed, date_from=date_from, date_to=date_to))
+    else:
+        keys = list(index.keys)
+    if others:
+        keys = [key for key in keys if all(index.meta.get(key, {}).get(t) == v for t, v in others.items())]
+    return keys
+
+
+def local_path(out_dir: str, key: str) -> str:
+    path = os.path.normpath(os.path.join(out_dir, key))
+    root = os.path.abspath(out_dir)
+    if os.path.abspath(path) == root or os.path.commonpath([root, os.path.abspath(path)]) != root:
+        raise ValueError(f"Refusing to write {key!r} outside {out_dir}")
+    return path
+
+
+def read_done(path: str) -> dict:
+    """
+    s3_key -> ETag of the records already in a JSONL export or directory
+    manifest. A torn last line left by an interrupted run is cut off so
+    appending resumes cleanly.
+    """
+    done = {}
+    good_end = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                done[record["s3_key"]] = record.get("etag")
+                good_end += len(line)
+    except FileNotFoundError:
+        return done
+    with open(path, "r+b") as f:
+        f.truncate(good_end)
+    return done
+
+
+def download_file(s3, bucket: str, key: str, path: str) -> str:
+    """Streams the object's raw bytes to `path` (via a temp file); returns the ETag S3 served."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    response = s3.get_object(Bucket=bucket, Key=key)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(response["Body"], f, 1024 * 1024)
+    os.replace(tmp_path, path)
+    return response.get("ETag")
+
+
+def download_record(s3, bucket: str, key: str, tags: dict) -> str:
+    """One JSONL line: key, ETag, tags and the decoded (decompressed) contents."""
+    response = s3.get_object(Bucket=bucket, Key=key)
+    content, _ = read_text(response["Body"], detect_encoding(key, response.get("ContentEncoding")))
+    record = {"s3_key": key, "etag": response.get("ETag"), "tags": tags, "content": content}
+    return json.dumps(record) + "\n"
+
+
+def run_bounded(executor, jobs, on_done, max_pending: int):
+    """
+    Submits (key, fn, args) jobs with at most `max_pending` in flight and
+    calls on_done(key, future) on this thread as each finishes.
+    """
+    pending = {}
+    for key, fn, args in jobs:
+        if len(pending) >= max_pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                on_done(pending.pop(future), future)
+        pending[executor.submit(fn, *args)] = key
+    for future in list(pending):
+        future.exception()  # wait
+        on_done(pending.pop(future), future)
+
+
+def export(s3, bucket: str, index, keys: list, out_dir: str = None, jsonl: str = None, workers: int = 16) -> dict:
+    """Downloads `keys` into `out_dir` (one file per key) or appends them to `jsonl` ("-" = stdout)."""
+    counts = {"matched": len(keys), "skipped": 0, "exported": 0, "failed": 0}
+    etags = {key: index.meta.get(key, {}).get("etag") for key in keys}
+    started = time.perf_counter()
+
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        done = read_done(os.path.join(out_dir, MANIFEST_NAME))
+        sink = open(os.path.join(out_dir, MANIFEST_NAME), "a")
+    elif jsonl == "-":
+        done, sink = {}, sys.stdout
+    else:
+        done = read_done(jsonl)
+        sink = open(jsonl, "a")
+
+    def is_done(key):
+        if key not in done or done[key] != etags[key]:
+            return False
+        return not out_dir or os.path.exists(local_path(out_dir, key))
+
+    todo = [key for key in keys if not is_done(key)]
+    counts["skipped"] = len(keys) - len(todo)
+
+    if out_dir:
+        jobs = ((key, download_file, (s3, bucket, key, local_path(out_dir, key))) for key in todo)
+    else:
+        jobs = ((key, download_record, (s3, bucket, key, index.meta.get(key, {}))) for key in todo)
+
+    def on_done(key, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.error(f"Failed to export {key}: {e}")
+            counts["failed"] += 1
+            return
+        if out_dir:
+            # Only recorded once the file is in place, so an interrupted download is retried
+            sink.write(json.dumps({"s3_key": key, "etag": result or etags[key]}) + "\n")
+        else:
+            sink.write(result)
+        sink.flush()
+        counts["exported"] += 1
+        if counts["exported"] % 1000 == 0:
+            logging.info(f"Exported {counts['exported']}/{len(todo)} files...")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-export") as executor:
+            run_bounded(executor, jobs, on_done, max_pending=workers * 4)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+
+    counts["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def parse_tag(value: str):
+    tag, sep, tag_value = value.partition("=")
+    if not sep or not tag:
+        raise argparse.ArgumentTypeError(f"expected TAG=VALUE, got {value!r}")
+    return tag, tag_value
+
+
+def parse_date(value: str) -> str:
+    """YYYY-MM-DD, zero-padded the way the date index stores it."""
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a YYYY-MM-DD date, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export S3 violation files matching tag filters, using the tag index")
+    parser.add_argument("--tag", type=parse_tag, action="append", default=[], metavar="TAG=VALUE",
+                        help="tag filter, repeatable; every filter must match")
+    parser.add_argument("--date-from", type=parse_date, help="inclusive YYYY-MM-DD")
+    parser.add_argument("--date-to", type=parse_date, help="inclusive YYYY-MM-DD")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--out", help="directory to download matching files into (keeps their keys as paths)")
+    target.add_argument("--jsonl", help="write one JSON record per file to this file, or - for stdout")
+    parser.add_argument("--snapshot", default=os.getenv("TAG_INDEX_SNAPSHOT", "tag_index.snap"))
+    parser.add_argument("--bucket", default=BUCKET_NAME)
+    parser.add_argument("--workers", type=int, default=16, help="parallel downloads")
+    parser.add_argument("--endpoint-url", default=None, help="S3-compatible endpoint, e.g. a local moto server")
+    parser.add_argument("--list", action="store_true", help="only print the matching keys")
+    args = parser.parse_args()
+    if not (args.list or args.out or args.jsonl):
+        parser.error("one of --out, --jsonl or --list is required")
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    index = open_snapshot(args.snapshot)
+    tags = dict(args.tag)
+    if not tags and not (args.date_from or args.date_to):
+        parser.error("give at least one --tag or a date range")
+
+    keys = select_keys(index, tags, args.date_from, args.date_to)
+    logging.info(f"{len(keys)} keys match {tags} in {args.snapshot} (generation {index.generation}).")
+    if args.list:
+        for key in keys:
+            print(f"s3://{args.bucket}/{key}")
+        return
+
+    s3 = make_s3_client(args.workers, endpoint_url=args.endpoint_url)
+    counts = export(s3, args.bucket, index, keys, out_dir=args.out, jsonl=args.jsonl, workers=args.workers)
+    logging.info(
+        f"Export done: {counts['exported']} exported, {counts['skipped']} already up to date, "
+        f"{counts['failed']} failed of {counts['matched']} matched in {counts['elapsed_s']}s."
+    )
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
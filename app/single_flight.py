@@ -0,0 +1,35 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one computation.
+
+    The computation runs in a task owned by this object rather than by the
+    caller that started it, and every caller, that one included, awaits it
+    through asyncio.shield. A caller that is cancelled (e.g. because its
+    client disconnected) stops waiting without cancelling the work the
+    other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._tasks = {}  # key -> asyncio.Task, only touched on the event loop
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, compute):
+        """Result of `await compute()`, shared with every concurrent run() for `key`."""
+        task = self._tasks.get(key)
+        if task is None:
+            self.started += 1
+            task = self._tasks[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved, even if every caller has stopped waiting
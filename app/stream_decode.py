@@ -0,0 +1,110 @@
+import codecs
+import gzip
+import re
+
+# Bytes pulled from S3 (and from the decompressor) per read
+CHUNK_SIZE = 64 * 1024
+
+GZIP_ENCODINGS = ("gzip", "x-gzip")
+GZIP_EXTENSIONS = (".gz", ".gzip")
+ZSTD_ENCODINGS = ("zstd",)
+ZSTD_EXTENSIONS = (".zst", ".zstd")
+
+
+TRUNCATION_MARKER_RE = re.compile(r"\n\[\.\.\. truncated: [^\n]* \.\.\.\]\Z")
+
+
+def truncation_marker(reason: str) -> str:
+    return f"\n[... truncated: {reason} ...]"
+
+
+def strip_truncation_marker(text: str) -> str:
+    """`text` without the marker truncation_marker() appended, e.g. before indexing its words."""
+    return TRUNCATION_MARKER_RE.sub("", text)
+
+
+def detect_encoding(key: str, content_encoding: str = None):
+    """'gzip', 'zstd' or None, from the object's Content-Encoding, else its key extension."""
+    encoding = (content_encoding or "").strip().lower()
+    if encoding in GZIP_ENCODINGS:
+        return "gzip"
+    if encoding in ZSTD_ENCODINGS:
+        return "zstd"
+    lowered = key.lower()
+    if lowered.endswith(GZIP_EXTENSIONS):
+        return "gzip"
+    if lowered.endswith(ZSTD_EXTENSIONS):
+        return "zstd"
+    return None
+
+
+def open_decoded(body, encoding: str = None):
+    """File-like view of `body` (anything with read(n)) that decompresses as it is read."""
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=body, mode="rb")
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Reading zstd objects requires zstandard (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(body)
+    return body
+
+
+def head(text: str, lines: int) -> str:
+    """First `lines` lines of already decoded `text`, with a marker if anything was cut."""
+    cut = -1
+    for _ in range(lines):
+        cut = text.find("\n", cut + 1)
+        if cut < 0:
+            return text
+    if cut + 1 == len(text):
+        return text
+    return text[:cut + 1] + truncation_marker(f"first {lines} lines shown")
+
+
+def read_text(body, encoding: str = None, max_bytes: int = None, head_lines: int = None) -> tuple:
+    """
+    Streams `body` through the decompressor and a UTF-8 decoder, keeping at
+    most `max_bytes` decoded bytes and, if given, the first `head_lines`
+    lines. Stops reading as soon as either limit is hit, so memory stays
+    bounded by the limits rather than the object size. Returns (text,
+    truncated); truncated text ends with a truncation marker.
+    """
+    stream = open_decoded(body, encoding)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts, size, lines = [], 0, 0
+    truncated = None
+
+    while truncated is None:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            parts.append(decoder.decode(b"", final=True))
+            break
+        if max_bytes is not None and size + len(chunk) > max_bytes:
+            # A multi-byte character cut at the limit is dropped, not replaced
+            chunk = chunk[:max_bytes - size]
+            truncated = f"first {max_bytes} bytes shown"
+        size += len(chunk)
+        text = decoder.decode(chunk)
+
+        if head_lines is not None:
+            newlines = text.count("\n")
+            if lines + newlines >= head_lines:
+                cut = -1
+                for _ in range(head_lines - lines):
+                    cut = text.index("\n", cut + 1)
+                more = cut + 1 < len(text) or truncated is not None or stream.read(1)
+                text = text[:cut + 1]
+                truncated = f"first {head_lines} lines shown" if more else None
+                parts.append(text)
+                break
+            lines += newlines
+        parts.append(text)
+
+    if hasattr(body, "close"):
+        body.close()  # drop the rest of the download instead of draining it
+    text = "".join(parts)
+    if truncated:
+        return text + truncation_marker(truncated), True
+    return text, False
@@ -0,0 +1,190 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from metrics import instrument_s3_client
+
+# Error codes S3 returns when we are going faster than the bucket allows
+THROTTLE_CODES = {"SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "503"}
+
+
+@dataclass
+class HarvestResult:
+    entries: list = field(default_factory=list)   # flat tag_index.json entries, in listing order
+    changed: list = field(default_factory=list)   # entries whose tags were (re)fetched this run
+    removed: list = field(default_factory=list)   # keys in `previous` that are no longer listed
+    listed: int = 0
+    reused: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+
+def make_s3_client(max_workers: int = 16, endpoint_url: str = None):
+    """
+    S3 client whose connection pool is large enough for `max_workers` threads.
+    Pass `endpoint_url` to point at a local stand-in such as a moto server.
+    Its calls and errors are counted in the metrics module.
+    """
+    config = Config(
+        max_pool_connections=max_workers,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
+    return instrument_s3_client(boto3.client("s3", config=config, endpoint_url=endpoint_url))
+
+
+def _is_throttle(e: Exception) -> bool:
+    if not isinstance(e, ClientError):
+        return False
+    error = e.response.get("Error", {})
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return error.get("Code") in THROTTLE_CODES or status == 503
+
+
+def fetch_tags(s3, bucket: str, key: str, max_retries: int = 5, base_delay: float = 0.2) -> dict:
+    """
+    get_object_tagging with exponential backoff (full jitter) on throttling.
+    Any other error is raised straight away.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            tags = s3.get_object_tagging(Bucket=bucket, Key=key)["TagSet"]
+            return {t["Key"]: t["Value"] for t in tags}
+        except Exception as e:
+            if not _is_throttle(e) or attempt == max_retries:
+                raise
+            time.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+
+
+def _listing_meta(obj: dict) -> dict:
+    last_modified = obj.get("LastModified")
+    if hasattr(last_modified, "isoformat"):
+        last_modified = last_modified.isoformat()
+    return {"etag": obj.get("ETag"), "last_modified": last_modified, "size": obj.get("Size")}
+
+
+def _unchanged(prev: dict, meta: dict) -> bool:
+    return (
+        prev is not None
+        and meta["etag"] is not None
+        and prev.get("etag") == meta["etag"]
+        and prev.get("last_modified") == meta["last_modified"]
+    )
+
+
+def harvest_tags(
+    s3,
+    bucket: str,
+    prefix: str,
+    previous: dict = None,
+    max_workers: int = 16,
+    max_retries: int = 5,
+    progress_every: int = 1000,
+    on_progress=None,
+) -> HarvestResult:
+    """
+    Lists `bucket/prefix` and fetches the tags of every object on a pool of
+    `max_workers` threads. Keys are submitted as soon as their list page
+    arrives, and at most 2 * max_workers lookups are queued at a time so the
+    listing never runs far ahead of the workers.
+
+    `previous` maps s3_key -> entry from the last harvest. When given, keys
+    whose ETag and LastModified are unchanged keep their previous entry
+    without a get_object_tagging call, so a refresh only pays for churn.
+    Note that re-tagging an object in place changes neither field; a full
+    harvest (previous=None) is needed to pick that up.
+
+    `on_progress(done, listed)` is called every `progress_every` keys.
+    """
+    started = time.perf_counter()
+    result = HarvestResult()
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    lock = threading.Lock()
+    done = 0
+    previous = previous or {}
+
+    def tag_one(key, meta):
+        nonlocal done
+        try:
+            tag_dict = fetch_tags(s3, bucket, key, max_retries=max_retries)
+            tag_dict["s3_key"] = key
+            tag_dict.update(meta)
+            return tag_dict, True
+        except Exception as e:
+            logging.error(f"Failed to get tags for {key}: {e}")
+            # Keep the stale entry rather than dropping the key; its old ETag
+            # makes the next incremental refresh try again.
+            return previous.get(key), False
+        finally:
+            in_flight.release()
+            with lock:
+                done += 1
+                if progress_every and done % progress_every == 0:
+                    logging.info(f"Tagged {done}/{result.listed} keys listed so far")
+                    if on_progress:
+                        on_progress(done, result.listed)
+
+    futures = []
+    listed_keys = set()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tag-harvest") as pool:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith("/"):
+                    continue
+                result.listed += 1
+                listed_keys.add(key)
+                meta = _listing_meta(obj)
+                prev = previous.get(key)
+                if _unchanged(prev, meta):
+                    result.reused += 1
+                    futures.append(prev)
+                    continue
+                in_flight.acquire()
+                futures.append(pool.submit(tag_one, key, meta))
+
+        for future in futures:
+            if isinstance(future, dict):
+                result.entries.append(future)
+                continue
+            entry, fetched = future.result()
+            if not fetched:
+                result.failed += 1
+            if entry is None:
+                continue
+            result.entries.append(entry)
+            if fetched:
+                result.changed.append(entry)
+
+    result.removed = [key for key in previous if key not in listed_keys]
+
+    result.elapsed = time.perf_counter() - started
+    if on_progress:
+        on_progress(done, result.listed)
+    return result
+
+
+if __name__ == "__main__":
+    # Quick benchmark, e.g. against `moto_server -p 5000`:
+    #   python tag_harvester.py --endpoint-url http://localhost:5000 --workers 32
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark concurrent S3 tag harvesting")
+    parser.add_argument("--bucket", default="romitestbucket07")
+    parser.add_argument("--prefix", default="llm-dev/security_data/")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--endpoint-url", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = make_s3_client(args.workers, endpoint_url=args.endpoint_url)
+    res = harvest_tags(client, args.bucket, args.prefix, max_workers=args.workers)
+    rate = res.listed / res.elapsed if res.elapsed else 0.0
+    print(f"{res.listed} keys, {res.failed} failed, {res.reused} reused, {res.elapsed:.2f}s ({rate:.0f} keys/s) with {args.workers} workers")
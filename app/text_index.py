@@ -0,0 +1,373 @@
+import heapq
+import itertools
+import math
+import os
+import re
+import shutil
+import struct
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+
+from index_snapshot import (
+    U64,
+    MappedStrings,
+    SnapshotError,
+    align_sections,
+    map_file,
+    write_sections,
+)
+from tag_index import intersect_postings
+
+# Full-text index layout (little-endian), written next to the tag snapshot:
+#
+#   header    MAGIC, version, doc count, generation, total tokens,
+#             then (offset, length) for each of the sections below
+#   terms     string table of terms, sorted
+#   offsets   u64 per term: where its postings start in `postings`
+#   postings  per term: u32 df, u32 doc_ids[df], u32 pos_starts[df + 1], u32 positions[]
+#   docs      string table of s3 keys, position = doc ID
+#   etags     string table of the ETag each doc was indexed at
+#   stored    blob table of zlib-compressed indexed text, for snippets
+#   lengths   u32 token count per doc
+#
+# Doc IDs are the key IDs of the tag index generation the text index was
+# built for, so a tag filter result can be intersected with term postings
+# directly.
+MAGIC = b"S3TXTIDX"
+VERSION = 1
+SECTIONS = ("terms", "offsets", "postings", "docs", "etags", "stored", "lengths")
+HEADER = struct.Struct("<8sIIQQ" + "QQ" * len(SECTIONS))
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]+)"|(\S+)')
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 80
+
+# Token positions buffered in memory during a build before they are spilled to a sorted run
+RUN_TOKENS = 4 * 1024 * 1024
+# Run file record: term length, df, position count; then the term, doc_ids[df], pos_starts[df + 1], positions[]
+RUN_RECORD = struct.Struct("<III")
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased word tokens as (token, start, end) character spans."""
+    return [(m.group().lower(), m.start(), m.end()) for m in TOKEN_RE.finditer(text)]
+
+
+def parse_query(query: str):
+    """Splits a query into loose terms and "quoted phrases" (each a list of terms)."""
+    terms, phrases = [], []
+    for phrase, word in QUERY_RE.findall(query):
+        tokens = [t for t, _, _ in tokenize(phrase or word)]
+        if phrase and len(tokens) > 1:
+            phrases.append(tokens)
+        else:
+            terms.extend(tokens)
+    return terms, phrases
+
+
+class _Spool:
+    """Section bytes collected in a temp file while the index is built, then copied into it."""
+
+    def __init__(self, tmp_dir: str):
+        self.file = tempfile.TemporaryFile(dir=tmp_dir)
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.size += len(data)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def write_to(self, f):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, f, 1024 * 1024)
+
+    def close(self):
+        self.file.close()
+
+
+class _SpooledTable(_Spool):
+    """A string / blob table (see pack_blob_table) whose blob is spooled; only the offsets stay in memory."""
+
+    def __init__(self, tmp_dir: str):
+        super().__init__(tmp_dir)
+        self.offsets = array("Q", [0])
+
+    def append(self, blob: bytes):
+        self.write(blob)
+        self.offsets.append(self.size)
+
+    def __len__(self) -> int:
+        return U64.size + self.offsets.itemsize * len(self.offsets) + self.size
+
+    def write_to(self, f):
+        f.write(U64.pack(len(self.offsets) - 1))
+        f.write(self.offsets.tobytes())
+        super().write_to(f)
+
+
+def _write_run(tmp_dir: str, run: dict):
+    """Spills one batch of postings (term -> (doc_ids, pos_starts, positions)) to a temp file, terms sorted."""
+    f = tempfile.TemporaryFile(dir=tmp_dir)
+    for term in sorted(run):
+        doc_ids, pos_starts, positions = run[term]
+        encoded = term.encode("utf-8")
+        f.write(RUN_RECORD.pack(len(encoded), len(doc_ids), len(positions)))
+        f.write(encoded)
+        f.write(doc_ids.tobytes() + pos_starts.tobytes() + positions.tobytes())
+    f.flush()
+    return f
+
+
+def _scan_run(f, run_no: int):
+    """Yields (term, run_no, df, position count, payload offset) per term of a run, without reading the payloads."""
+    f.seek(0)
+    while True:
+        head = f.read(RUN_RECORD.size)
+        if not head:
+            return
+        term_len, df, n_positions = RUN_RECORD.unpack(head)
+        term = f.read(term_len).decode("utf-8")
+        offset = f.tell()
+        f.seek(4 * (2 * df + 1 + n_positions), os.SEEK_CUR)
+        yield term, run_no, df, n_positions, offset
+
+
+def _merge_runs(runs: list, terms: _SpooledTable, offsets: array, postings: _Spool):
+    """
+    Merges the sorted runs into the final terms / offsets / postings
+    sections. Runs hold consecutive doc ID ranges, so a term's postings are
+    its runs' postings concatenated in run order, with the position starts
+    shifted; only one run's share of one term is in memory at a time.
+    """
+    merged = heapq.merge(*(_scan_run(f, run_no) for run_no, f in enumerate(runs)))
+    for term, group in itertools.groupby(merged, key=lambda record: record[0]):
+        group = list(group)
+        terms.append(term.encode("utf-8"))
+        offsets.append(postings.size)
+        postings.write(struct.pack("<I", sum(df for _, _, df, _, _ in group)))
+        for _, run_no, df, _, offset in group:
+            postings.write(os.pread(runs[run_no].fileno(), 4 * df, offset))
+        base = 0
+        for i, (_, run_no, df, n_positions, offset) in enumerate(group):
+            pos_starts = array("I")
+            pos_starts.frombytes(os.pread(runs[run_no].fileno(), 4 * (df + 1), offset + 4 * df))
+            if i:
+                pos_starts = array("I", (start + base for start in pos_starts[1:]))
+            postings.write(pos_starts.tobytes())
+            base += n_positions
+        for _, run_no, df, n_positions, offset in group:
+            postings.write(os.pread(runs[run_no].fileno(), 4 * n_positions, offset + 4 * (2 * df + 1)))
+
+
+def build_text_index(path: str, docs, generation: int, max_stored_bytes: int = 256 * 1024, run_tokens: int = RUN_TOKENS):
+    """
+    Writes a positional inverted index to `path` from `docs`, an iterable of
+    (s3_key, etag, text) covering every key of the tag index generation, in
+    key ID order. Pass text=None (and etag=None) for a key whose content
+    could not be read. Text beyond `max_stored_bytes` is neither indexed
+    nor stored.
+
+    Memory stays bounded for any number of docs: postings are spilled to a
+    sorted run file every `run_tokens` tokens and the runs merged at the
+    end, and the keys, ETags and stored text are spooled to temp files next
+    to `path`, keeping only their offsets in memory.
+    """
+    tmp_dir = os.path.dirname(os.path.abspath(path))
+    keys, etags, stored = _SpooledTable(tmp_dir), _SpooledTable(tmp_dir), _SpooledTable(tmp_dir)
+    terms, postings = _SpooledTable(tmp_dir), _Spool(tmp_dir)
+    lengths = array("I")
+    total_tokens = 0
+    runs, run, run_size = [], {}, 0
+
+    try:
+        for doc_id, (key, etag, text) in enumerate(docs):
+            text = (text or "").encode("utf-8")[:max_stored_bytes].decode("utf-8", "ignore")
+            tokens = tokenize(text)
+            keys.append(key.encode("utf-8"))
+            etags.append((etag or "").encode("utf-8"))
+            stored.append(zlib.compress(text.encode("utf-8")) if text else b"")
+            lengths.append(len(tokens))
+            total_tokens += len(tokens)
+
+            positions = {}
+            for position, (token, _, _) in enumerate(tokens):
+                positions.setdefault(token, []).append(position)
+            for token, token_positions in positions.items():
+                term_postings = run.get(token)
+                if term_postings is None:
+                    term_postings = run[token] = (array("I"), array("I", [0]), array("I"))
+                doc_ids, pos_starts, run_positions = term_postings
+                doc_ids.append(doc_id)
+                run_positions.extend(token_positions)
+                pos_starts.append(len(run_positions))
+
+            run_size += len(tokens)
+            if run_size >= run_tokens:
+                runs.append(_write_run(tmp_dir, run))
+                run, run_size = {}, 0
+        if run:
+            runs.append(_write_run(tmp_dir, run))
+            run = {}
+
+        offsets = array("Q")
+        _merge_runs(runs, terms, offsets, postings)
+        for f in runs:
+            f.close()  # give the disk back before the final copy
+
+        sections = [terms, offsets.tobytes(), postings, keys, etags, stored, lengths.tobytes()]
+        table = align_sections(sections, HEADER.size)
+        header = HEADER.pack(MAGIC, VERSION, len(keys.offsets) - 1, generation, total_tokens, *table)
+        write_sections(path, header, sections, table)
+    finally:
+        for spool in (keys, etags, stored, terms, postings, *runs):
+            spool.close()
+
+
+class _TermPostings:
+    def __init__(self, buf: memoryview):
+        (df,) = struct.unpack_from("<I", buf, 0)
+        words = buf[4:].cast("I")
+        self.doc_ids = words[:df]
+        self.pos_starts = words[df:2 * df + 1]
+        self.positions = words[2 * df + 1:]
+
+    def positions_for(self, doc_id: int):
+        i = bisect_left(self.doc_ids, doc_id)
+        if i == len(self.doc_ids) or self.doc_ids[i] != doc_id:
+            return ()
+        return self.positions[self.pos_starts[i]:self.pos_starts[i + 1]]
+
+
+class TextIndex:
+    """Memory-mapped, read-only view of a file written by build_text_index()."""
+
+    def __init__(self, path: str):
+        buf = map_file(path)
+        if len(buf) < HEADER.size:
+            raise SnapshotError(f"{path} is truncated")
+        magic, version, n_docs, generation, total_tokens, *table = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a text index")
+        if version != VERSION:
+            raise SnapshotError(f"{path} has text index version {version}, expected {VERSION}")
+
+        section = {
+            name: buf[table[2 * i]:table[2 * i] + table[2 * i + 1]]
+            for i, name in enumerate(SECTIONS)
+        }
+        self.generation = generation
+        self.terms = MappedStrings(section["terms"])
+        self._offsets = section["offsets"].cast("Q")
+        self._postings = section["postings"]
+        self.docs = MappedStrings(section["docs"])
+        self.etags = MappedStrings(section["etags"])
+        self._stored = MappedStrings(section["stored"])
+        self.lengths = section["lengths"].cast("I")
+        self.avg_length = total_tokens / n_docs if n_docs else 0.0
+        if len(self.docs) != n_docs:
+            raise SnapshotError(f"{path} doc table does not match its header")
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def postings(self, term: str):
+        i = bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        end = self._offsets[i + 1] if i + 1 < len(self._offsets) else len(self._postings)
+        return _TermPostings(self._postings[self._offsets[i]:end])
+
+    def stored_text(self, doc_id: int) -> str:
+        raw = self._stored.raw(doc_id)
+        return zlib.decompress(raw).decode("utf-8") if len(raw) else ""
+
+    def stored_text_for(self, key: str, etag: str):
+        """Stored text if `key` was indexed at `etag`, so a rebuild can skip the download."""
+        doc_id = self.doc_id(key)
+        if doc_id is None or not etag or self.etags[doc_id] != etag:
+            return None
+        return self.stored_text(doc_id)
+
+    def doc_id(self, key: str):
+        i = bisect_left(self.docs, key)
+        if i < len(self.docs) and self.docs[i] == key:
+            return i
+        return None
+
+    def search(self, query: str, candidates=None, limit: int = 10) -> list:
+        """
+        Docs containing every term and phrase of `query`, optionally limited
+        to the sorted doc IDs in `candidates`, ranked by BM25. Returns
+        (score, doc_id, snippet) tuples, best first.
+        """
+        terms, phrases = parse_query(query)
+        wanted = list(dict.fromkeys(terms + [t for phrase in phrases for t in phrase]))
+        if not wanted:
+            return []
+
+        term_postings = {}
+        for term in wanted:
+            postings = self.postings(term)
+            if postings is None:
+                return []
+            term_postings[term] = postings
+
+        lists = [p.doc_ids for p in term_postings.values()]
+        if candidates is not None:
+            lists.append(candidates)
+        matched = intersect_postings(lists)
+
+        n_docs = len(self.docs)
+        idf = {
+            term: math.log(1 + (n_docs - len(p.doc_ids) + 0.5) / (len(p.doc_ids) + 0.5))
+            for term, p in term_postings.items()
+        }
+
+        scored = []
+        for doc_id in matched:
+            positions = {term: p.positions_for(doc_id) for term, p in term_postings.items()}
+            if not all(_phrase_at(positions, phrase) is not None for phrase in phrases):
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / (self.avg_length or 1))
+            score = sum(
+                idf[term] * len(pos) * (BM25_K1 + 1) / (len(pos) + norm)
+                for term, pos in positions.items()
+            )
+            scored.append((score, doc_id, positions))
+
+        top = heapq.nlargest(limit, scored, key=lambda item: item[0])
+        return [
+            (round(score, 4), doc_id, self._snippet(doc_id, positions, phrases, terms))
+            for score, doc_id, positions in top
+        ]
+
+    def _snippet(self, doc_id: int, positions: dict, phrases: list, terms: list) -> str:
+        # Centre the snippet on the first phrase hit, else the first term hit
+        if phrases:
+            start = _phrase_at(positions, phrases[0])
+            end = start + len(phrases[0]) - 1
+        else:
+            start = end = min(min(positions[t]) for t in terms if positions.get(t))
+        text = self.stored_text(doc_id)
+        tokens = tokenize(text)
+        if start >= len(tokens):
+            return ""
+        lo = max(0, tokens[start][1] - SNIPPET_CHARS)
+        hi = min(len(text), tokens[min(end, len(tokens) - 1)][2] + SNIPPET_CHARS)
+        snippet = " ".join(text[lo:hi].split())
+        return ("…" if lo > 0 else "") + snippet + ("…" if hi < len(text) else "")
+
+
+def _phrase_at(positions: dict, phrase: list):
+    """First position where `phrase` occurs, given each term's positions in one doc."""
+    following = [set(positions.get(term, ())) for term in phrase[1:]]
+    for start in positions.get(phrase[0], ()):
+        if all(start + i + 1 in pos for i, pos in enumerate(following)):
+            return start
+    return None
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+
+import httpx
+
+from single_flight import SingleFlight
+
+
+class WeatherClient:
+    """
+    Async OpenWeatherMap client for the get_weather tool: one pooled
+    httpx.AsyncClient (keep-alive connections, explicit timeouts) shared by
+    every call, in front of a TTL cache keyed on coordinates rounded to
+    `precision` decimals (2 decimals is roughly 1 km), so repeated lookups
+    for nearby points are answered locally.
+
+    Point `base_url` at a local mock server, or pass an httpx `transport`
+    (e.g. httpx.MockTransport), to run without the real API.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.openweathermap.org/data/2.5",
+        timeout: float = 5.0,
+        ttl: float = 600.0,
+        precision: int = 2,
+        max_entries: int = 10_000,
+        max_connections: int = 20,
+        transport=None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, 3.0))
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.ttl = ttl
+        self.precision = precision
+        self.max_entries = max_entries
+        self.transport = transport
+        self._client = None
+        self._entries = OrderedDict()  # (lat, lon) -> (expires_at, result)
+        self._flights = SingleFlight()
+        self.hits = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the server's event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout, limits=self.limits, transport=self.transport
+            )
+        return self._client
+
+    async def current(self, lat: float, lon: float) -> dict:
+        """Simplified current weather at (lat, lon), cached per rounded coordinate."""
+        key = (round(lat, self.precision), round(lon, self.precision))
+        item = self._entries.get(key)
+        if item is not None and item[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+        async def fetch_and_store():
+            result = await self._fetch(*key)
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return result
+
+        # Concurrent lookups of one point share a single request (see SingleFlight)
+        return await self._flights.run(key, fetch_and_store)
+
+    async def _fetch(self, lat: float, lon: float) -> dict:
+        params = {"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"}
+        response = await self.client.get("/weather", params=params)
+        response.raise_for_status()
+        data = response.json()
+
+        # Return a simplified weather summary
+        return {
+            "location": data.get("name"),
+            "temperature_celsius": data.get("main", {}).get("temp"),
+            "weather_description": data.get("weather", [{}])[0].get("description")
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self._flights.started, "entries": len(self._entries)}
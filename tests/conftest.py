@@ -0,0 +1,38 @@
+import os
+import sys
+
+# The app modules import each other as top-level modules (python app/mcp_server.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+import random
+
+import pytest
+
+USERS = [f"user{i:02d}@example.com" for i in range(12)]
+MODEL_CONFIGS = ["test1", "test2", "test3", "prod"]
+
+
+def random_entries(n: int, seed: int = 0) -> list:
+    """Tag index entries shaped like the harvester's, with skewed values and some missing tags."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        entry = {
+            "s3_key": f"llm-dev/security_data/{rng.randrange(10 ** 6):06d}-{i}.json",
+            "etag": f'"{i:016x}"',
+            "last_modified": "2025-01-01T00:00:00+00:00",
+            "size": rng.randrange(100, 5000),
+        }
+        if rng.random() < 0.95:
+            entry["user_id"] = USERS[min(int(rng.expovariate(0.4)), len(USERS) - 1)]
+        if rng.random() < 0.9:
+            entry["model_config"] = rng.choice(MODEL_CONFIGS)
+        if rng.random() < 0.9:
+            entry.update(year="2025", month=str(rng.randint(1, 3)), day=str(rng.randint(1, 28)))
+        entries.append(entry)
+    return entries
+
+
+@pytest.fixture
+def entries():
+    return random_entries(2000)
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+
+import pytest
+
+anyio = pytest.importorskip("anyio")
+pytest.importorskip("agents")
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.exceptions import McpError
+from mcp.shared.memory import create_client_server_memory_streams
+
+from agents_openai import ResilientMCPServerSse
+
+
+class MemoryMCPServer(ResilientMCPServerSse):
+    """
+    ResilientMCPServerSse talking to an in-process MCP server over memory
+    streams. Like sse_client, the transport runs in a task group, so it has
+    to be closed by the task that opened it. drop() breaks the connection.
+    """
+
+    def __init__(self, tool_timeout: float = 60.0):
+        super().__init__(
+            params={"url": "http://memory/sse"}, name="memory", version_check_seconds=1e9, max_retries=2, base_delay=0.01,
+            tool_timeout=tool_timeout,
+        )
+        self.connections = 0
+        self.refuse = 0  # connection attempts to fail, as if the server were down
+        self._drop = None
+
+    @contextlib.asynccontextmanager
+    async def create_streams(self):
+        if self.refuse:
+            self.refuse -= 1
+            raise ConnectionError("connection refused")
+        app = FastMCP("test")
+
+        @app.tool()
+        def echo(text: str) -> str:
+            return text
+
+        @app.tool()
+        async def slow(seconds: float) -> str:
+            await anyio.sleep(seconds)
+            return "done"
+
+        server = app._mcp_server
+        server_scope = anyio.CancelScope()
+
+        async def run_server():
+            with server_scope:
+                await server.run(*server_streams, server.create_initialization_options())
+
+        async def drop():
+            server_scope.cancel()
+            await server_streams[0].aclose()  # the client's next send fails
+
+        async with create_client_server_memory_streams() as (client_streams, server_streams):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(run_server)
+                self.connections += 1
+                self._drop = drop
+                yield client_streams
+                server_scope.cancel()
+
+    async def drop(self):
+        await self._drop()
+
+
+def echoed(result) -> str:
+    return result.content[0].text
+
+
+def test_reconnects_from_child_tasks():
+    async def main():
+        async with MemoryMCPServer() as server:
+            # The SDK calls tools from asyncio.gather tasks, never from the task that connected
+            assert echoed(await asyncio.create_task(server.call_tool("echo", {"text": "a"}))) == "a"
+
+            await server.drop()
+            results = await asyncio.gather(*(server.call_tool("echo", {"text": str(i)}) for i in range(5)))
+            assert [echoed(r) for r in results] == [str(i) for i in range(5)]
+            assert server.connections == 2  # concurrent callers share one reconnect
+
+            await server.drop()
+            assert echoed(await asyncio.create_task(server.call_tool("echo", {"text": "b"}))) == "b"
+            assert server.connections == 3
+
+    asyncio.run(asyncio.wait_for(main(), timeout=30))
+
+
+def test_failed_reconnect_raises_and_next_call_retries():
+    async def main():
+        async with MemoryMCPServer() as server:
+            await server.drop()
+            server.refuse = 2  # every attempt of the first round
+            with pytest.raises(ConnectionError):
+                await asyncio.create_task(server.call_tool("echo", {"text": "a"}))
+
+            # The server is back: the next call starts a new round of attempts
+            assert echoed(await asyncio.create_task(server.call_tool("echo", {"text": "b"}))) == "b"
+            assert sorted(tool.name for tool in await server.list_tools()) == ["echo", "slow"]
+
+    asyncio.run(asyncio.wait_for(main(), timeout=30))
+
+
+def test_slow_tool_times_out_without_dropping_the_session():
+    async def main():
+        async with MemoryMCPServer(tool_timeout=0.2) as server:
+            slow = asyncio.create_task(server.call_tool("slow", {"seconds": 1.0}))
+            fast = asyncio.create_task(server.call_tool("echo", {"text": "a"}))
+            assert echoed(await fast) == "a"
+            with pytest.raises(McpError):
+                await slow
+            # Timeouts are not retried and don't reconnect, so other calls keep the session
+            assert echoed(await asyncio.create_task(server.call_tool("echo", {"text": "b"}))) == "b"
+            assert server.connections == 1
+
+    asyncio.run(asyncio.wait_for(main(), timeout=30))
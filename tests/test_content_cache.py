@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from content_cache import ContentCache
+
+
+def disk_files(cache_dir) -> list:
+    return sorted(os.path.join(d, name) for d, _, names in os.walk(cache_dir) for name in names)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ContentCache(max_bytes=10)
+    cache.put("a", "1", "aaaa")
+    cache.put("b", "1", "bbbb")
+    assert cache.get("a", "1") == "aaaa"  # b is now the oldest
+    cache.put("c", "1", "cccc")
+    assert cache.get("b", "1") is None
+    assert cache.get("a", "1") == "aaaa" and cache.get("c", "1") == "cccc"
+    assert cache.stats()["bytes"] == 8 and cache.evictions == 1
+
+
+def test_a_new_etag_misses_and_replaces_the_disk_copy(tmp_path):
+    cache = ContentCache(cache_dir=str(tmp_path))
+    cache.put("k", '"v1"', "old")
+    assert cache.get("k", '"v2"') is None
+    assert cache.get("k", None) is None  # no ETag, no way to validate
+    cache.put("k", '"v2"', "new")
+    assert cache.get("k", '"v2"') == "new"
+    assert len(disk_files(tmp_path)) == 1  # only the newest version stays on disk
+
+    restarted = ContentCache(cache_dir=str(tmp_path))
+    assert restarted.get("k", '"v1"') is None
+    assert restarted.get("k", '"v2"') == "new"
+    assert restarted.disk_hits == 1
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ContentCache(max_bytes=0, cache_dir=str(tmp_path), disk_max_bytes=25)
+    for key in "abc":
+        cache.put(key, "1", key * 10)
+    assert cache.get("a", "1") is None  # evicted to make room for c
+    assert cache.get("b", "1") == "b" * 10
+    assert cache.stats()["disk_bytes"] == 20 and cache.disk_evictions == 1
+    assert len(disk_files(tmp_path)) == 2
+
+
+def test_restart_scan_enforces_the_budget_and_drops_torn_writes(tmp_path):
+    cache = ContentCache(max_bytes=0, cache_dir=str(tmp_path))
+    for n, key in enumerate("abc"):
+        cache.put(key, "1", key * 10)
+        _, path = cache._disk_paths(key, "1")
+        os.utime(path, ns=(n * 10 ** 9, n * 10 ** 9))  # a is the least recently used
+    with open(os.path.join(tmp_path, "torn.1234.tmp"), "w") as f:
+        f.write("partial")
+
+    restarted = ContentCache(max_bytes=0, cache_dir=str(tmp_path), disk_max_bytes=25)
+    assert not os.path.exists(os.path.join(tmp_path, "torn.1234.tmp"))
+    assert restarted.get("a", "1") is None
+    assert restarted.get("c", "1") == "c" * 10
+    assert restarted.stats()["disk_bytes"] == 20
+
+
+def test_fetcher_refetches_when_the_indexed_etag_changes(tmp_path):
+    pytest.importorskip("boto3")
+    from fake_s3 import SyntheticS3
+    from object_fetch import ObjectFetcher
+
+    s3 = SyntheticS3(10, body_bytes=64)
+    fetcher = ObjectFetcher("bucket", max_concurrency=2, cache=ContentCache(cache_dir=str(tmp_path)), s3=s3)
+    key = s3.key(3)
+    assert fetcher.get_text(key, s3.etag(3)) == s3.body(3).decode()
+    assert fetcher.get_text(key, s3.etag(3)) == s3.body(3).decode()
+    assert s3.calls["GetObject"] == 1
+
+    s3.versions[3] = 1  # rewritten in S3; the next index refresh records the new ETag
+    assert fetcher.get_text(key, s3.etag(3)) == s3.body(3).decode()
+    assert s3.calls["GetObject"] == 2
+    assert fetcher.get_text(key, s3.etag(3)) == s3.body(3).decode()
+    assert s3.calls["GetObject"] == 2
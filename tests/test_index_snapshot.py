@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from index_snapshot import SnapshotError, open_snapshot, write_snapshot
+from tag_index import TagIndex
+from test_tag_index import TAGS, random_query
+
+
+def plain(lookup: dict) -> dict:
+    return {tag: {value: list(ids) for value, ids in values.items()} for tag, values in lookup.items()}
+
+
+def assert_same_index(loaded: TagIndex, index: TagIndex):
+    assert list(loaded.keys) == index.keys
+    assert loaded.tags == index.tags
+    assert plain(loaded.lookup) == plain(index.lookup)
+    assert dict(loaded.meta) == dict(index.meta)
+    assert loaded.generation == index.generation
+    assert loaded.built_at == index.built_at
+    for tag in index.lookup:
+        assert list(loaded.column(tag)[1]) == list(index.column(tag)[1])
+    rng = random.Random(4)
+    for _ in range(200):
+        filters, date_from, date_to = random_query(rng)
+        assert list(loaded.match(filters, date_from, date_to)) == list(index.match(filters, date_from, date_to))
+
+
+def test_snapshot_round_trip(entries, tmp_path):
+    index = TagIndex.build(entries, TAGS)
+    index.generation = 7
+    write_snapshot(index, str(tmp_path / "index.snap"))
+
+    loaded = open_snapshot(str(tmp_path / "index.snap"))
+    assert set(loaded.columns) == set(index.lookup)
+    assert_same_index(loaded, index)
+
+
+def test_empty_snapshot_round_trip(tmp_path):
+    write_snapshot(TagIndex.empty(TAGS), str(tmp_path / "empty.snap"))
+    loaded = open_snapshot(str(tmp_path / "empty.snap"))
+    assert len(loaded) == 0
+    assert len(loaded.match({"user_id": "someone"})) == 0
+
+
+def test_corrupt_snapshots_are_rejected(entries, tmp_path):
+    path = tmp_path / "index.snap"
+    write_snapshot(TagIndex.build(entries[:10], TAGS), str(path))
+    data = path.read_bytes()
+
+    path.write_bytes(b"NOTANIDX" + data[8:])
+    with pytest.raises(SnapshotError):
+        open_snapshot(str(path))
+    for version in (1, 99):  # version 1 snapshots had no columns and are no longer read
+        path.write_bytes(data[:8] + version.to_bytes(4, "little") + data[12:])
+        with pytest.raises(SnapshotError):
+            open_snapshot(str(path))
+    path.write_bytes(data[:20])
+    with pytest.raises(SnapshotError):
+        open_snapshot(str(path))
@@ -0,0 +1,91 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from inventory_ingest import InventoryShrinkError, ingest_inventory
+from tag_index import TagIndex
+
+TAGS = ["model_config", "user_id"]
+SCHEMA = "Bucket, Key, Size, LastModifiedDate, ETag, Tags"
+
+
+def write_inventory(directory, rows: list) -> str:
+    """A local CSV inventory: manifest.json plus one data file with `rows` (fileSchema order)."""
+    with open(directory / "data.csv", "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    manifest = {"fileFormat": "CSV", "fileSchema": SCHEMA, "files": [{"key": "inventory/data.csv"}]}
+    (directory / "manifest.json").write_text(json.dumps(manifest))
+    return str(directory / "manifest.json")
+
+
+def inventory_rows(n: int) -> list:
+    return [
+        ["bucket", f"llm-dev/security_data/{i}.json", "100", "2025-01-01T00:00:00.000Z", f"{i:032x}",
+         f"model_config=test1&user_id=user{i % 3}%40example.com"]
+        for i in range(n)
+    ]
+
+
+def test_failed_check_keeps_the_previous_json(tmp_path):
+    json_path = tmp_path / "tag_index.json"
+    json_path.write_text("[]\n")
+    current = TagIndex.build(
+        [{"s3_key": f"llm-dev/security_data/{i}.json", "model_config": "test1"} for i in range(10)], TAGS
+    )
+
+    manifest = write_inventory(tmp_path, inventory_rows(3))
+    with pytest.raises(InventoryShrinkError):
+        ingest_inventory(manifest, TAGS, json_path=str(json_path), current=current)
+    assert json_path.read_text() == "[]\n"
+    assert not (tmp_path / "tag_index.json.tmp").exists()
+
+    manifest = write_inventory(tmp_path, inventory_rows(8))
+    index = ingest_inventory(manifest, TAGS, json_path=str(json_path), current=current)
+    assert len(index) == 8
+    assert [entry["s3_key"] for entry in json.loads(json_path.read_text())] == list(index.keys)
+
+
+def test_inventory_rows_become_harvester_entries(tmp_path):
+    rows = [
+        # URL-encoded key and tags, bare ETag, millisecond UTC timestamp
+        ["bucket", "llm-dev/security_data/a+b%2Bc.json", "120", "2025-03-04T05:06:07.000Z", "0123abcd",
+         "model_config=test1&user_id=u1%40example.com&year=2025&month=03&day=04"],
+        # JSON tags, already quoted ETag, empty size
+        ["bucket", "llm-dev/security_data/b.json", "", "2025-03-04T05:06:07+00:00", '"ffff"',
+         '{"model_config": "prod"}'],
+        ["bucket", "llm-dev/security_data/", "0", "2025-03-04T05:06:07.000Z", "00", ""],  # folder marker
+        ["bucket", "other/c.json", "5", "2025-03-04T05:06:07.000Z", "00", "model_config=test1"],
+        ["bucket", "llm-dev/security_data/untagged.json", "7", "not a date", "01", ""],
+    ]
+    manifest = write_inventory(tmp_path, rows)
+    json_path = tmp_path / "tag_index.json"
+    index = ingest_inventory(manifest, TAGS, prefix="llm-dev/security_data/", json_path=str(json_path))
+
+    assert list(index.keys) == [
+        "llm-dev/security_data/a b+c.json", "llm-dev/security_data/b.json", "llm-dev/security_data/untagged.json",
+    ]
+    assert index.meta["llm-dev/security_data/a b+c.json"] == {
+        "model_config": "test1", "user_id": "u1@example.com", "year": "2025", "month": "03", "day": "04",
+        "s3_key": "llm-dev/security_data/a b+c.json",
+        "etag": '"0123abcd"',
+        "last_modified": "2025-03-04T05:06:07+00:00",  # what the harvester records from list_objects_v2
+        "size": 120,
+    }
+    assert index.meta["llm-dev/security_data/b.json"]["etag"] == '"ffff"'
+    assert index.meta["llm-dev/security_data/b.json"]["size"] is None
+    assert index.meta["llm-dev/security_data/untagged.json"]["last_modified"] == "not a date"
+    assert list(index.match({"user_id": "u1@example.com"})) == [0]
+    assert index.group_counts(["model_config"]) == {"test1": 1, "prod": 1}
+    assert json.loads(json_path.read_text()) == [index.meta[key] for key in index.keys]
+
+
+def test_gzipped_data_files_are_read(tmp_path):
+    manifest = write_inventory(tmp_path, inventory_rows(5))
+    with open(tmp_path / "data.csv", "rb") as f, gzip.open(tmp_path / "data.csv.gz", "wb") as out:
+        out.write(f.read())
+    data = json.loads((tmp_path / "manifest.json").read_text())
+    data["files"] = [{"key": "inventory/data.csv.gz"}]
+    (tmp_path / "manifest.json").write_text(json.dumps(data))
+    assert len(ingest_inventory(manifest, TAGS)) == 5
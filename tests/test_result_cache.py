@@ -0,0 +1,90 @@
+import asyncio
+
+from result_cache import ResultCache
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"items": [1]}
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+        assert results == [{"items": [1]}] * 5
+        assert await cache.get_or_compute("key", compute) == {"items": [1]}
+
+    asyncio.run(main())
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4 and cache.stats()["hits"] == 1
+
+
+def test_uncacheable_results_are_recomputed():
+    cache = ResultCache()
+    results = iter([{"ok": False}, {"ok": True}, {"ok": None}])
+
+    async def compute():
+        return next(results)
+
+    async def main():
+        assert await cache.get_or_compute("key", compute, cacheable=lambda r: r["ok"]) == {"ok": False}
+        assert await cache.get_or_compute("key", compute, cacheable=lambda r: r["ok"]) == {"ok": True}
+        assert await cache.get_or_compute("key", compute, cacheable=lambda r: r["ok"]) == {"ok": True}
+
+    asyncio.run(main())
+
+
+def test_entries_are_evicted_by_size():
+    cache = ResultCache(max_bytes=30, sizeof=lambda result: 10)
+
+    async def main():
+        for i in range(5):
+            await cache.get_or_compute(i, lambda i=i: asyncio.sleep(0, result=i))
+
+    asyncio.run(main())
+    assert cache.stats()["entries"] == 3 and cache.stats()["evictions"] == 2
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_others():
+    cache = ResultCache()
+    started = asyncio.Event()
+
+    async def compute():
+        started.set()
+        await asyncio.sleep(0.05)
+        return {"items": [1]}
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_compute("key", compute))
+        await started.wait()
+        follower = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == {"items": [1]}
+        assert leader.cancelled()
+        assert await cache.get_or_compute("key", compute) == {"items": [1]}  # stored despite the cancel
+
+    asyncio.run(main())
+    assert cache.stats()["misses"] == 1
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    cache = ResultCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("S3 down")
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        results = await asyncio.gather(cache.get_or_compute("key", compute), return_exceptions=True)
+        assert isinstance(results[0], RuntimeError)
+
+    asyncio.run(main())
+    assert len(calls) == 2
@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("boto3")
+from fake_s3 import SyntheticS3
+from s3_access import MANIFEST_NAME, export, local_path, read_done
+from tag_index import TagIndex
+
+
+@pytest.mark.parametrize("out_dir", [".", "./", "exports", "exports/", "/tmp/exports"])
+def test_local_path_stays_under_out_dir(out_dir):
+    assert local_path(out_dir, "llm-dev/a.json") == os.path.normpath(os.path.join(out_dir, "llm-dev/a.json"))
+    for key in ("../a.json", "llm-dev/../../a.json", "/etc/passwd", ".", ""):
+        with pytest.raises(ValueError):
+            local_path(out_dir, key)
+
+
+def synthetic_index(s3: SyntheticS3) -> TagIndex:
+    entries = [{"s3_key": s3.key(i), "etag": s3.etag(i), **s3.tags(i)} for i in range(s3.n_objects)]
+    return TagIndex.build(entries, ["model_config", "user_id"])
+
+
+def records(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_read_done_cuts_a_torn_last_line(tmp_path):
+    path = tmp_path / "export.jsonl"
+    assert read_done(str(path)) == {}
+    good = json.dumps({"s3_key": "a", "etag": '"1"'}) + "\n" + json.dumps({"s3_key": "b", "etag": '"2"'}) + "\n"
+    path.write_text(good + '{"s3_key": "c", "et')
+    assert read_done(str(path)) == {"a": '"1"', "b": '"2"'}
+    assert path.read_text() == good
+
+
+def test_jsonl_export_resumes_after_failures_and_a_torn_line(tmp_path):
+    s3 = SyntheticS3(20, body_bytes=64)
+    index = synthetic_index(s3)
+    path = str(tmp_path / "export.jsonl")
+    get_object = s3.get_object
+    s3.get_object = lambda Bucket, Key: get_object(Bucket=Bucket, Key=Key) if Key < s3.key(10) else 1 / 0
+
+    counts = export(s3, "bucket", index, index.keys, jsonl=path, workers=4)
+    assert (counts["exported"], counts["failed"], counts["skipped"]) == (10, 10, 0)
+
+    s3.get_object = get_object
+    with open(path, "a") as f:
+        f.write('{"s3_key": "llm-dev/secu')  # killed mid-write
+    counts = export(s3, "bucket", index, index.keys, jsonl=path, workers=4)
+    assert (counts["exported"], counts["failed"], counts["skipped"]) == (10, 0, 10)
+    exported = records(path)
+    assert sorted(record["s3_key"] for record in exported) == list(index.keys)
+    assert all(record["content"] == s3.body(int(record["s3_key"][-13:-5])).decode() for record in exported)
+
+    counts = export(s3, "bucket", index, index.keys, jsonl=path, workers=4)
+    assert (counts["exported"], counts["skipped"]) == (0, 20)
+
+
+def test_directory_export_redownloads_missing_and_changed_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    s3 = SyntheticS3(10, body_bytes=64)
+    index = synthetic_index(s3)
+    counts = export(s3, "bucket", index, index.keys, out_dir=".", workers=4)
+    assert counts["exported"] == 10
+    assert (tmp_path / s3.key(4)).read_bytes() == s3.body(4)
+
+    (tmp_path / s3.key(4)).unlink()
+    s3.versions[7] = 1
+    index = synthetic_index(s3)
+    counts = export(s3, "bucket", index, index.keys, out_dir=".", workers=4)
+    assert (counts["exported"], counts["skipped"]) == (2, 8)
+    assert (tmp_path / s3.key(7)).read_bytes() == s3.body(7)
+    assert read_done(MANIFEST_NAME)[s3.key(7)] == s3.etag(7)
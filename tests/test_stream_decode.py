@@ -0,0 +1,103 @@
+import gzip
+import io
+
+import pytest
+
+import stream_decode
+from stream_decode import detect_encoding, head, read_text, strip_truncation_marker, truncation_marker
+
+LINES = "".join(f"line {i}: é\n" for i in range(50))  # 12 bytes per line, with a two-byte character
+
+
+class Body(io.BytesIO):
+    """S3 StreamingBody stand-in that records how far it was read."""
+
+    def read(self, n=-1):
+        chunk = super().read(n)
+        self.bytes_read = self.tell()
+        return chunk
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Small reads so limits fall inside, at and across chunk boundaries
+    monkeypatch.setattr(stream_decode, "CHUNK_SIZE", 7)
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_whole_body_round_trips(encoding):
+    data = LINES.encode("utf-8")
+    body = gzip.compress(data) if encoding else data
+    assert read_text(Body(body), encoding) == (LINES, False)
+
+
+def test_max_bytes_boundaries():
+    data = LINES.encode("utf-8")
+    assert read_text(Body(data), max_bytes=len(data)) == (LINES, False)
+
+    text, truncated = read_text(Body(data), max_bytes=len(data) - 1)
+    assert truncated
+    assert text == LINES[:-1] + truncation_marker(f"first {len(data) - 1} bytes shown")
+
+    # A limit inside "é" drops the partial character instead of emitting a replacement
+    cut = data.index("é".encode("utf-8")) + 1
+    text, truncated = read_text(Body(data), max_bytes=cut)
+    assert truncated and strip_truncation_marker(text) == data[:cut - 1].decode("utf-8")
+
+
+def test_max_bytes_counts_decoded_bytes():
+    data = LINES.encode("utf-8")
+    text, truncated = read_text(Body(gzip.compress(data)), "gzip", max_bytes=100)
+    assert truncated
+    assert strip_truncation_marker(text).encode("utf-8") == data[:100]
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_head_lines_boundaries(encoding):
+    def body(text):
+        data = text.encode("utf-8")
+        return Body(gzip.compress(data) if encoding else data)
+
+    lines = LINES.splitlines(keepends=True)
+    assert read_text(body(LINES), encoding, head_lines=50) == (LINES, False)
+    assert read_text(body(LINES), encoding, head_lines=60) == (LINES, False)
+    assert read_text(body(LINES.rstrip("\n")), encoding, head_lines=50) == (LINES.rstrip("\n"), False)
+
+    text, truncated = read_text(body(LINES), encoding, head_lines=49)
+    assert truncated and text == "".join(lines[:49]) + truncation_marker("first 49 lines shown")
+    text, truncated = read_text(body(LINES), encoding, head_lines=1)
+    assert truncated and strip_truncation_marker(text) == lines[0]
+
+
+def test_head_lines_stops_reading_early():
+    body = Body(LINES.encode("utf-8") * 1000)
+    read_text(body, head_lines=3)
+    assert body.bytes_read < 100
+    assert body.closed
+
+
+def test_first_limit_hit_wins():
+    data = LINES.encode("utf-8")
+    text, truncated = read_text(Body(data), max_bytes=30, head_lines=10)
+    assert truncated and text.endswith(truncation_marker("first 30 bytes shown"))
+    text, truncated = read_text(Body(data), max_bytes=1000, head_lines=2)
+    assert truncated and text.endswith(truncation_marker("first 2 lines shown"))
+
+
+def test_head_matches_streamed_head():
+    for n in (1, 49, 50, 51):
+        assert head(LINES, n) == read_text(Body(LINES.encode("utf-8")), head_lines=n)[0]
+
+
+def test_strip_truncation_marker_only_strips_a_trailing_marker():
+    marker = truncation_marker("first 10 bytes shown")
+    assert strip_truncation_marker("text" + marker) == "text"
+    assert strip_truncation_marker(marker + " text") == marker + " text"
+    assert strip_truncation_marker("text") == "text"
+
+
+def test_detect_encoding():
+    assert detect_encoding("a.json", "gzip") == "gzip"
+    assert detect_encoding("a.json.gz") == "gzip"
+    assert detect_encoding("a.json.zst", None) == "zstd"
+    assert detect_encoding("a.json", "identity") is None
@@ -0,0 +1,112 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("botocore")
+import tag_harvester
+from fake_s3 import SyntheticS3
+from tag_harvester import fetch_tags, harvest_tags
+
+BUCKET = "bucket"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    # Replaces the harvester's own view of the time module, not time.sleep for every thread
+    delays = []
+    monkeypatch.setattr(tag_harvester, "time", SimpleNamespace(sleep=delays.append, perf_counter=time.perf_counter))
+    return delays
+
+
+def test_harvest_matches_the_bucket():
+    s3 = SyntheticS3(300, users=20)
+    result = harvest_tags(s3, BUCKET, s3.prefix, max_workers=8, progress_every=0)
+    assert result.listed == 300 and result.failed == 0 and result.reused == 0
+    assert [entry["s3_key"] for entry in result.entries] == [s3.key(i) for i in range(300)]
+    for i, entry in enumerate(result.entries):
+        assert {tag: entry[tag] for tag in s3.tags(i)} == s3.tags(i)
+        assert entry["etag"] == s3.etag(i)
+    assert s3.calls["GetObjectTagging"] == 300
+
+
+def test_throttled_calls_are_retried(no_backoff):
+    s3 = SyntheticS3(300, users=20, throttle_rate=0.3)
+    result = harvest_tags(s3, BUCKET, s3.prefix, max_workers=8, max_retries=20, progress_every=0)
+    assert result.failed == 0
+    assert len(result.entries) == 300
+    assert s3.calls["GetObjectTagging"] > 300
+    assert len(no_backoff) == s3.calls["GetObjectTagging"] - 300  # one backoff per throttled call
+
+
+def test_fetch_tags_backs_off_exponentially_then_gives_up(no_backoff):
+    s3 = SyntheticS3(10, throttle_rate=1.0)
+    with pytest.raises(tag_harvester.ClientError):
+        fetch_tags(s3, BUCKET, s3.key(0), max_retries=3, base_delay=1.0)
+    assert s3.calls["GetObjectTagging"] == 4
+    assert [delay <= 2 ** attempt for attempt, delay in enumerate(no_backoff)] == [True] * 3
+
+
+def test_other_errors_are_not_retried(no_backoff):
+    s3 = SyntheticS3(10)
+    with pytest.raises(tag_harvester.ClientError):
+        fetch_tags(s3, BUCKET, s3.prefix + "missing.json")
+    assert s3.calls["GetObjectTagging"] == 1
+    assert no_backoff == []
+
+
+def test_keys_that_keep_failing_are_counted_not_indexed():
+    s3 = SyntheticS3(50, throttle_rate=1.0)
+    result = harvest_tags(s3, BUCKET, s3.prefix, max_workers=4, max_retries=1, progress_every=0)
+    assert result.listed == 50 and result.failed == 50
+    assert result.entries == [] and result.changed == []
+
+
+def test_incremental_harvest_only_fetches_churn():
+    s3 = SyntheticS3(300, users=20)
+    full = harvest_tags(s3, BUCKET, s3.prefix, max_workers=8, progress_every=0)
+    previous = {entry["s3_key"]: entry for entry in full.entries}
+
+    s3.mutate(0.1, delete_fraction=0.05)
+    s3.calls.clear()
+    result = harvest_tags(s3, BUCKET, s3.prefix, previous=previous, max_workers=8, progress_every=0)
+
+    rewritten = {s3.key(i) for i in s3.versions if i not in s3.deleted}
+    assert {entry["s3_key"] for entry in result.changed} == rewritten
+    assert s3.calls["GetObjectTagging"] == len(rewritten)
+    assert result.reused == result.listed - len(rewritten)
+    assert sorted(result.removed) == sorted(s3.key(i) for i in s3.deleted)
+    assert [entry["s3_key"] for entry in result.entries] == [
+        s3.key(i) for i in range(300) if i not in s3.deleted
+    ]
+
+
+def test_failed_incremental_fetch_keeps_the_stale_entry():
+    s3 = SyntheticS3(100, users=20)
+    full = harvest_tags(s3, BUCKET, s3.prefix, max_workers=4, progress_every=0)
+    previous = {entry["s3_key"]: entry for entry in full.entries}
+
+    s3.mutate(0.1)
+    broken = s3.key(min(s3.versions))
+    get_object_tagging = s3.get_object_tagging
+
+    def failing(Bucket, Key):
+        if Key == broken:
+            raise tag_harvester.ClientError({"Error": {"Code": "AccessDenied", "Message": Key}}, "GetObjectTagging")
+        return get_object_tagging(Bucket=Bucket, Key=Key)
+
+    s3.get_object_tagging = failing
+    result = harvest_tags(s3, BUCKET, s3.prefix, previous=previous, max_workers=4, progress_every=0)
+    assert result.failed == 1
+    assert broken not in {entry["s3_key"] for entry in result.changed}
+    assert previous[broken] in result.entries  # old tags and old ETag, not dropped
+    assert result.removed == []
+
+    # The old ETag no longer matches the listing, so the next refresh retries the key
+    s3.get_object_tagging = get_object_tagging
+    retried = harvest_tags(
+        s3, BUCKET, s3.prefix, previous={entry["s3_key"]: entry for entry in result.entries},
+        max_workers=4, progress_every=0,
+    )
+    assert [entry["s3_key"] for entry in retried.changed] == [broken]
+    assert retried.failed == 0
@@ -0,0 +1,115 @@
+import random
+from collections import Counter
+
+from conftest import MODEL_CONFIGS, USERS, random_entries
+from tag_index import DATE_TAG, TagIndex, entry_date
+
+TAGS = ["model_config", "user_id", "year", "month", "day"]
+
+
+def brute_force(entries, filters, date_from=None, date_to=None) -> list:
+    keys = []
+    for entry in entries:
+        if not all(entry.get(tag) == value for tag, value in filters.items() if value):
+            continue
+        if date_from or date_to:
+            date = entry_date(entry)
+            if date is None or (date_from and date < date_from) or (date_to and date > date_to):
+                continue
+        keys.append(entry["s3_key"])
+    return sorted(keys)
+
+
+def random_query(rng: random.Random):
+    filters = {}
+    if rng.random() < 0.6:
+        filters["user_id"] = rng.choice(USERS + ["nobody@example.com"])
+    if rng.random() < 0.5:
+        filters["model_config"] = rng.choice(MODEL_CONFIGS)
+    if rng.random() < 0.3:
+        filters["month"] = str(rng.randint(1, 4))
+    date_from = date_to = None
+    if rng.random() < 0.4:
+        date_from = f"2025-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}"
+    if rng.random() < 0.4:
+        date_to = f"2025-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}"
+    return filters, date_from, date_to
+
+
+def test_match_agrees_with_brute_force(entries):
+    index = TagIndex.build(entries, TAGS)
+    rng = random.Random(1)
+    for _ in range(1000):
+        filters, date_from, date_to = random_query(rng)
+        if not filters and not (date_from or date_to):
+            continue
+        ids = index.match(filters, date_from=date_from, date_to=date_to)
+        assert list(ids) == sorted(ids)
+        assert index.keys_for(ids) == brute_force(entries, filters, date_from, date_to), (filters, date_from, date_to)
+
+
+def test_match_ignores_empty_filters(entries):
+    index = TagIndex.build(entries, TAGS)
+    assert index.keys_for(index.match({"user_id": USERS[0], "model_config": None, "month": ""})) == \
+        brute_force(entries, {"user_id": USERS[0]})
+    assert len(index.match({})) == 0
+
+
+def test_page_walks_every_match_once(entries):
+    index = TagIndex.build(entries, TAGS)
+    ids = index.match({"model_config": "test1"})
+    seen, after_key = [], None
+    while True:
+        page, has_more = index.page(ids, after_key=after_key, limit=7)
+        assert len(page) <= 7
+        seen += index.keys_for(page)
+        if not has_more:
+            break
+        after_key = seen[-1]
+    assert seen == index.keys_for(ids)
+
+
+def test_page_cursor_survives_a_new_generation(entries):
+    index = TagIndex.build(entries, TAGS)
+    first, _ = index.page(index.match({"model_config": "test1"}), limit=10)
+    after_key = index.keys_for(first)[-1]
+
+    # Keys before and after the cursor appear; the cursor itself needn't exist any more
+    added = [{**entries[0], "s3_key": "a-first.json", "model_config": "test1"},
+             {**entries[0], "s3_key": "zz-last.json", "model_config": "test1"}]
+    newer = index.apply_delta(added, removed=[after_key])
+    page, _ = newer.page(newer.match({"model_config": "test1"}), after_key=after_key)
+    expected = [key for key in brute_force(entries + added, {"model_config": "test1"}) if key > after_key]
+    assert newer.keys_for(page) == expected
+
+
+def test_apply_delta_equals_a_rebuild(entries):
+    index = TagIndex.build(entries, TAGS)
+    rng = random.Random(2)
+    removed = [entry["s3_key"] for entry in rng.sample(entries, 100)]
+    changed = [{**entry, "user_id": "moved@example.com"} for entry in rng.sample(entries, 100)]
+    changed += random_entries(50, seed=3)
+
+    delta = index.apply_delta(changed, removed)
+
+    merged = {entry["s3_key"]: entry for entry in entries}
+    for key in removed:
+        merged.pop(key)
+    merged.update((entry["s3_key"], entry) for entry in changed)
+    rebuilt = TagIndex.build(merged.values(), TAGS)
+
+    assert delta.keys == rebuilt.keys
+    assert {tag: {v: list(ids) for v, ids in values.items()} for tag, values in delta.lookup.items()} == \
+        {tag: {v: list(ids) for v, ids in values.items()} for tag, values in rebuilt.lookup.items()}
+    assert dict(delta.meta) == merged
+    assert index.key_id(removed[0]) is not None  # the original index is untouched
+
+
+def test_group_counts_agree_with_brute_force(entries):
+    index = TagIndex.build(entries, TAGS)
+    ids = index.match({"model_config": "test2"})
+    # Keys without a value for a grouped tag are counted under None
+    expected = Counter(
+        (entry.get("user_id"), entry_date(entry)) for entry in entries if entry.get("model_config") == "test2"
+    )
+    assert index.group_counts(["user_id", DATE_TAG], ids) == expected
@@ -0,0 +1,60 @@
+import random
+from array import array
+
+from text_index import TextIndex, build_text_index
+
+WORDS = [f"w{i}" for i in range(200)] + ["prompt", "injection", "café"]
+
+
+def random_docs(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        if i % 50 == 0:
+            docs.append((f"key-{i:04d}", None, None))  # fetch failed
+            continue
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(1, 200)))
+        docs.append((f"key-{i:04d}", f'"etag-{i}"', text))
+    return docs
+
+
+def brute_force(docs, terms) -> set:
+    return {doc_id for doc_id, (_, _, text) in enumerate(docs) if text and set(terms) <= set(text.lower().split())}
+
+
+def test_spilled_runs_write_the_same_file(tmp_path):
+    docs = random_docs(500)
+    build_text_index(str(tmp_path / "one.text"), iter(docs), 1)
+    build_text_index(str(tmp_path / "many.text"), iter(docs), 1, run_tokens=100)
+    assert (tmp_path / "one.text").read_bytes() == (tmp_path / "many.text").read_bytes()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["many.text", "one.text"]  # no temp files left
+
+
+def test_round_trip_and_search(tmp_path):
+    docs = random_docs(500)
+    build_text_index(str(tmp_path / "index.text"), iter(docs), 9, run_tokens=100)
+    index = TextIndex(str(tmp_path / "index.text"))
+
+    assert index.generation == 9
+    assert len(index) == len(docs)
+    assert list(index.docs) == [key for key, _, _ in docs]
+    assert index.stored_text(1) == docs[1][2]
+    assert index.stored_text_for("key-0001", '"etag-1"') == docs[1][2]
+    assert index.stored_text_for("key-0001", '"other"') is None
+
+    for terms in (["prompt"], ["prompt", "injection"], ["café", "w7"]):
+        hits = index.search(" ".join(terms), limit=len(docs))
+        assert {doc_id for _, doc_id, _ in hits} == brute_force(docs, terms)
+
+    candidates = array("I", range(0, 500, 3))
+    hits = index.search("prompt", candidates=candidates, limit=len(docs))
+    assert {doc_id for _, doc_id, _ in hits} == brute_force(docs, ["prompt"]) & set(candidates)
+
+
+def test_phrase_search(tmp_path):
+    docs = [("a", "1", "a prompt injection here"), ("b", "2", "injection then prompt"), ("c", "3", None)]
+    build_text_index(str(tmp_path / "index.text"), iter(docs), 1)
+    index = TextIndex(str(tmp_path / "index.text"))
+    assert [doc_id for _, doc_id, _ in index.search('"prompt injection"')] == [0]
+    assert "prompt injection" in index.search('"prompt injection"')[0][2]
+    assert index.search("missing") == []
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+from weather_client import WeatherClient
+
+
+def make_client(requests: list, delay: float = 0.0) -> WeatherClient:
+    async def handler(request):
+        requests.append(request)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"name": "Here", "main": {"temp": 21.5}, "weather": [{"description": "clear"}]})
+
+    return WeatherClient(api_key="key", transport=httpx.MockTransport(handler))
+
+
+def test_nearby_points_share_one_request():
+    requests = []
+    client = make_client(requests, delay=0.01)
+
+    async def main():
+        results = await asyncio.gather(*(client.current(52.5201, 13.4012 + i / 10_000) for i in range(3)))
+        assert results[0] == {"location": "Here", "temperature_celsius": 21.5, "weather_description": "clear"}
+        assert await client.current(52.52, 13.40) == results[0]
+        await client.aclose()
+
+    asyncio.run(main())
+    assert len(requests) == 1
+    assert client.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_cancelled_caller_does_not_fail_the_others():
+    requests = []
+    client = make_client(requests, delay=0.05)
+
+    async def main():
+        first = asyncio.create_task(client.current(1.0, 2.0))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(client.current(1.0, 2.0))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert (await second)["location"] == "Here"
+        await client.aclose()
+
+    asyncio.run(main())
+    assert len(requests) == 1